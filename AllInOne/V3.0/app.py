@@ -4,6 +4,7 @@ import random, csv, os
 from datetime import datetime
 from collections import defaultdict
 from typing import List, Dict
+from name_index import NameIndex
 
 app = Flask(__name__)
 app.secret_key = 'shanghai-metro-guess-secret-key-2024'
@@ -287,28 +288,24 @@ except ImportError:
     fill_guo_problems = []
     
 def build_nation_lookup():
-    """构建国家名称查找字典 {name.lower(): {'zh_name': str, 'coords': list}}"""
-    lookup = {}
+    """构建国家名称索引：英文、中文、日文名称规范化后都能查到 {'zh_name': str, 'coords': list}
+
+    nation_lookup.get(名称) 大小写、全半角、平/片假名、’ 与 ' 等写法差异都不影响结果；
+    nation_lookup.complete(前缀) 用于输入补全。
+    """
+    names_per_nation, values = [], []
     for nation_info in nation_template:
+        names = []
         if nation_info and len(nation_info) > 3:
             # 假设 nation_info 格式为 [ [en_names], [zh_names], [other_names], [lat, lon] ]
-            # 将所有名称列表合并
-            all_names = []
-            for name_list in nation_info[:2]: # 取前三个列表（英文、中文、其他）
+            for name_list in nation_info[:3]: # 取前三个列表（英文、中文、日文）
                 if isinstance(name_list, list):
-                    all_names.extend(name_list)
-            coords = nation_info[3]
-
-            # 获取首选中文名（通常是列表第一个）
-            zh_name = nation_info[1][0] if nation_info[1] else "未知国家"
-
-            # 为每个名称创建映射
-            for name in all_names:
-                if isinstance(name, str) and name.strip():
-                    lookup[name.lower()] = {'zh_name': zh_name, 'coords': coords}
-    # print("Debug: Nation lookup keys (first 10):", list(lookup.keys())[:10])
-    # print("Debug: Example lookup entry for 'china':", lookup.get('china'))
-    return lookup
+                    names.extend(name_list)
+        # 获取首选中文名（通常是列表第一个）
+        zh_name = nation_info[1][0] if nation_info and len(nation_info) > 1 and nation_info[1] else "未知国家"
+        names_per_nation.append(names)
+        values.append({'zh_name': zh_name, 'coords': nation_info[3] if names else None})
+    return NameIndex(names_per_nation, values)
 
 # 构建查找字典
 nation_lookup = build_nation_lookup()
@@ -646,7 +643,7 @@ def submit_guess_guo_jing():
         return jsonify({'error': '数据错误'})
 
     # 在 nation_lookup 中查找猜测的国家信息 (现在查找的是输入的原始字符串)
-    lookup_result = nation_lookup.get(guess_input.lower())
+    lookup_result = nation_lookup.get(guess_input)
     if not lookup_result:
         return jsonify({'error': f'猜测的国家不存在: {guess_input}'})
 
@@ -744,7 +741,7 @@ def fill_guo_select_nation():
         return jsonify({'error': '数据错误'})
 
     # --- 修改：通过 nation_lookup 获取中文全称 ---
-    lookup_result = nation_lookup.get(nation_name_input.lower())
+    lookup_result = nation_lookup.get(nation_name_input)
     if not lookup_result:
         return jsonify({'error': f'选择的国家不存在: {nation_name_input}'})
 
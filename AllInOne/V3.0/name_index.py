@@ -0,0 +1,71 @@
+# name_index.py
+# 多语言名称索引：英文 / 中文 / 日文名称统一规范化后放进一个排好序的数组，
+# 精确查找走字典，前缀查找（输入补全）用二分定位到第一个匹配位置后顺序读取，都不需要遍历所有名称。
+#
+# 规范化（normalize）：
+#   NFKC          全角字母数字、半角片假名统一成普通形式（Ｆｒａｎｃｅ -> France，ｱﾙｼﾞｪﾘｱ -> アルジェリア）
+#   casefold      大小写不敏感（比 lower 更彻底）
+#   去掉拉丁字母的变音符号  Côte d'Ivoire 与 Cote d'Ivoire 相同（只去 U+0300~U+036F，不影响假名的浊点）
+#   平假名转片假名  あるじぇりあ 与 アルジェリア 相同
+#   标点统一      ’ ‘ ʼ ` ´ 统一成 '，各种横线统一成 -，中点（・ ·）和多余空白去掉
+import unicodedata
+from bisect import bisect_left
+
+_PUNCTUATION = str.maketrans({
+    '’': "'", '‘': "'", 'ʼ': "'", '`': "'", '´': "'",
+    '‐': '-', '‑': '-', '‒': '-', '–': '-', '—': '-', '−': '-',
+    '・': '', '·': '',
+})
+
+def normalize(name):
+    """名称的规范形式，用作索引的键"""
+    text = unicodedata.normalize('NFKC', name).casefold()
+    text = ''.join(c for c in unicodedata.normalize('NFD', text) if not '\u0300' <= c <= '\u036f')
+    text = unicodedata.normalize('NFC', text)
+    text = ''.join(chr(ord(c) + 0x60) if 'ぁ' <= c <= 'ゖ' else c for c in text)
+    return ' '.join(text.translate(_PUNCTUATION).split())
+
+class NameIndex:
+    """名称 -> 条目下标的索引
+
+    names_per_item[i] 是第 i 个条目（国家、城市……）的所有名称；values 可选，给出时 get 返回 values[i]。
+    不同条目的名称规范化后相同时，保留下标较小的条目。
+    """
+    __slots__ = ('keys', 'names', 'items', 'exact', 'values')
+
+    def __init__(self, names_per_item, values=None):
+        entries = {}
+        for item, names in enumerate(names_per_item):
+            for name in names:
+                if isinstance(name, str) and name.strip():
+                    entries.setdefault(normalize(name), (name, item))
+        self.keys = sorted(entries)                          # 规范化后的名称，已排序
+        self.names = [entries[key][0] for key in self.keys]  # 对应的原始名称
+        self.items = [entries[key][1] for key in self.keys]  # 对应的条目下标
+        self.exact = {key: entries[key][1] for key in self.keys}
+        self.values = values
+
+    def lookup(self, name):
+        """名称对应的条目下标，找不到返回 None"""
+        return self.exact.get(normalize(name)) if name else None
+
+    def get(self, name, default=None):
+        """名称对应的条目（有 values 时为 values 中的值），找不到返回 default"""
+        item = self.lookup(name)
+        if item is None:
+            return default
+        return item if self.values is None else self.values[item]
+
+    def complete(self, prefix, limit=10):
+        """以 prefix 开头的名称，按规范形式排序返回 [(原始名称, 条目下标), ...]，每个条目只出现一次"""
+        key = normalize(prefix)
+        if not key:
+            return []
+        result, seen = [], set()
+        for i in range(bisect_left(self.keys, key), len(self.keys)):
+            if not self.keys[i].startswith(key) or len(result) >= limit:
+                break
+            if self.items[i] not in seen:
+                seen.add(self.items[i])
+                result.append((self.names[i], self.items[i]))
+        return result
@@ -1,306 +1,824 @@
 # app.py
 from flask import Flask, render_template, request, jsonify, session, redirect
-import random, csv, os, logging
+import random, csv, os, logging, bisect, time, threading, atexit, sqlite3
 from datetime import datetime
 from collections import defaultdict
-from typing import List, Dict
+from contextlib import contextmanager
+from name_index import NameIndex
+from shanghai_metro import ShanghaiMetroGraph
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，用 msvcrt 加锁
+    fcntl = None
+    import msvcrt
 
 app = Flask(__name__)
 app.secret_key = 'your-very-secret-key-change-this'
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
 
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+MODULES = ['猜铁', '国景', '填国1', '填国2', '填国3']
+MODULE_INDEX = {module: i for i, module in enumerate(MODULES)}
+
+class ScoreRecord:
+    """一名玩家的成绩记录，计数均为整数，时间戳为秒数；只在读写CSV时与字符串互相转换"""
+    __slots__ = ('timestamp', 'class_name', 'name', 'success', 'attempts')
+
+    def __init__(self, class_name, name, timestamp=None):
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.class_name = class_name
+        self.name = name
+        # 按 MODULES 顺序存放各模块的通过题数和尝试次数；尝试次数为 None 表示 'N/A'
+        self.success = [0] * len(MODULES)
+        self.attempts = [0] * len(MODULES)
+
+    @property
+    def key(self):
+        return (self.class_name, self.name)
+
+    @property
+    def timestamp_text(self):
+        return time.strftime(TIMESTAMP_FORMAT, time.localtime(self.timestamp))
+
+    def success_of(self, module):
+        return self.success[MODULE_INDEX[module]]
+
+    def attempts_of(self, module):
+        return self.attempts[MODULE_INDEX[module]]
+
+    def attempts_text(self, module):
+        attempts = self.attempts[MODULE_INDEX[module]]
+        return 'N/A' if attempts is None else str(attempts)
+
+    def apply_result(self, module_name, success, attempts):
+        """把一局游戏的结果计入该模块的成绩"""
+        i = MODULE_INDEX[module_name]
+
+        # --- 获取旧值 ---
+        current_success = self.success[i]
+        current_attempts = self.attempts[i]
+        if current_attempts is None:
+            # 如果旧值是 'N/A'，则重置为0
+            current_success = 0
+            current_attempts = 0
+
+        # 更新时间戳
+        self.timestamp = time.time()
+
+        # --- 计算新值 ---
+        if module_name == "猜铁" or module_name == "国景":
+            # 成功：总题数 + 1；无论成败，总尝试次数 + 本轮尝试次数
+            self.success[i] = current_success + 1 if success else current_success
+            self.attempts[i] = current_attempts + attempts
+        else:
+            if success:
+                self.success[i] = 1
+                self.attempts[i] = attempts
+            else:
+                self.success[i] = 0
+                self.attempts[i] = None
+            print(f"DEBUG: After update - {module_name}_success: {self.success[i]}, {module_name}_attempts: {self.attempts_text(module_name)}")
+
+    def copy_from(self, other):
+        """用另一条记录的内容覆盖自身（保持对象身份不变，索引无需更新）"""
+        self.timestamp = other.timestamp
+        self.success = list(other.success)
+        self.attempts = list(other.attempts)
+
+    @classmethod
+    def from_row(cls, row):
+        """从CSV的一行（字段名 -> 字符串）解析出记录，非数字的值按原逻辑视为0"""
+        try:
+            timestamp = time.mktime(time.strptime(row.get('timestamp') or '', TIMESTAMP_FORMAT))
+        except ValueError:
+            timestamp = None
+        record = cls(row.get('class'), row.get('name'), timestamp)
+        for i, module in enumerate(MODULES):
+            raw_success = row.get(f"{module}_success") or '0'
+            raw_attempts = row.get(f"{module}_attempts") or '0'
+            try:
+                record.success[i] = int(raw_success)
+            except ValueError:
+                record.success[i] = 0
+            try:
+                record.attempts[i] = int(raw_attempts)
+            except ValueError:
+                # 与原先 int() 失败时的处理一致：该模块不计入成绩
+                record.success[i] = 0
+                record.attempts[i] = None if raw_attempts == 'N/A' else 0
+        return record
+
+    def to_row(self):
+        """转换成与 Leaderboard.FIELDNAMES 顺序一致的字符串列表"""
+        row = [self.timestamp_text, self.class_name, self.name]
+        for success, attempts in zip(self.success, self.attempts):
+            row.append(str(success))
+            row.append('N/A' if attempts is None else str(attempts))
+        return row
+
+def summarize_class(class_name, players, success_totals, attempts_totals):
+    """把班级的人数和各模块总和整理成可直接转成 JSON 的汇总"""
+    modules = {}
+    for module, success, attempts in zip(MODULES, success_totals, attempts_totals):
+        modules[module] = {
+            'avg_success': round(success / players, 2),
+            'avg_attempts': round(attempts / success, 2) if success > 0 else 0,
+        }
+    return {'class': class_name, 'players': players, 'modules': modules}
+
 class Leaderboard:
-    def __init__(self, filename='Leaderboard.csv'):
+    # 表头包括通用字段和各模块的字段
+    FIELDNAMES = ['timestamp', 'class', 'name', '猜铁_success', '猜铁_attempts', '国景_success', '国景_attempts', '填国1_success', '填国1_attempts', '填国2_success', '填国2_attempts', '填国3_success', '填国3_attempts']
+
+    def __init__(self, filename='Leaderboard.csv', journal=False, compact_every=200,
+                 write_behind=False, flush_interval_ms=500, flush_every=50, shared=False):
+        if shared and write_behind:
+            raise ValueError("shared mode cannot be combined with write_behind")
         self.filename = filename
+        # 多进程共享模式：写入前加文件锁，先合并其他进程追加的日志再追加自己的更新；
+        # 读取前根据快照和日志文件的变化刷新内存中的数据。共享模式总是使用日志
+        self.shared = shared
+        self.lock_filename = os.path.splitext(filename)[0] + '.lock'
+        self.snapshot_signature = None  # 上次读写快照时的 (mtime, 大小, inode)，其他进程压缩后会变化
+        self.journal_offset = 0         # 日志中已经合并进内存的字节数
+        # 日志模式：每次更新只追加一行到日志文件，累计 compact_every 条后再整体压缩成快照
+        self.journal = journal or shared
+        self.journal_filename = os.path.splitext(filename)[0] + '.journal'
+        self.compact_every = compact_every
+        self.journal_count = 0
         self.data = []
+        self.index = {}  # (班级, 姓名) -> 记录，与 self.data 保持同步
+        # 有序排名表：元素为 (-通过题数, 平均尝试次数, 序号, 班级, 姓名)，add_score 时用二分增量维护
+        self.ranking = []
+        self.rank_keys = {}  # (班级, 姓名) -> 该玩家当前在 ranking 中的元素
+        self.next_seq = 0    # 序号保证同分时保持原先稳定排序的先后顺序
+        # 按班级划分的排名表和班级汇总，与 ranking 一起增量维护
+        self.class_rankings = defaultdict(list)  # 班级 -> 该班的有序排名表（元素同 ranking）
+        self.class_totals = {}  # 班级 -> {'players': 人数, 'success': [各模块通过题数之和], 'attempts': [各模块尝试次数之和]}
+        self.contributions = {}  # (班级, 姓名) -> 该玩家当前计入班级汇总的 (通过题数, 尝试次数)
+        # 延迟写入模式：add_score 只更新内存并标记脏记录，由后台线程每 flush_interval_ms 毫秒
+        # 或累计 flush_every 次更新后统一写盘，请求本身不再等待磁盘 I/O
+        self.write_behind = write_behind
+        self.flush_interval_ms = flush_interval_ms
+        self.flush_every = flush_every
+        self.lock = threading.RLock()     # 保护内存中的数据
+        self.io_lock = threading.RLock()  # 串行化文件写入；需要同时持有时先取 io_lock 再取 lock
+        self.flush_cond = threading.Condition(self.lock)
+        self.dirty = set()         # 待写盘的 (班级, 姓名)
+        self.pending_updates = 0   # 上次写盘后累计的更新次数
+        self.flush_stats = {'flushes': 0, 'records': 0, 'last_ms': 0.0, 'max_ms': 0.0}
+        self.closed = False
+        self.flush_thread = None
         self.load()
+        if self.write_behind:
+            self.flush_thread = threading.Thread(target=self._flush_loop, name='leaderboard-flush', daemon=True)
+            self.flush_thread.start()
+            atexit.register(self.close)
 
     def load(self):
-        """从CSV文件加载排行榜数据"""
+        """从CSV文件加载排行榜数据（日志模式下再重放日志）"""
+        if self.shared:
+            with self.io_lock, self._file_lock():
+                self._load()
+        else:
+            self._load()
+
+    def _load(self, compact=True):
+        data = []
         if os.path.exists(self.filename):
             try:
                 with open(self.filename, 'r', newline='', encoding='utf-8') as f:
                     reader = csv.DictReader(f)
-                    self.data = [row for row in reader]
+                    data = [ScoreRecord.from_row(row) for row in reader]
             except Exception as e:
                 print(f"Error loading leaderboard: {e}")
-                self.data = []
         else:
             # 如果文件不存在，创建一个带表头的空文件
-            # 表头包括通用字段和三个模块的字段
             with open(self.filename, 'w', newline='', encoding='utf-8') as f:
-                fieldnames = ['timestamp', 'class', 'name', '猜铁_success', '猜铁_attempts', '国景_success', '国景_attempts', '填国1_success', '填国1_attempts', '填国2_success', '填国2_attempts', '填国3_success', '填国3_attempts']
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer = csv.DictWriter(f, fieldnames=self.FIELDNAMES)
                 writer.writeheader()
-            self.data = []
+
+        with self.lock:
+            self.snapshot_signature = self._snapshot_signature()
+            self.data = data
+            self._rebuild_index()
+            if self.journal:
+                self._replay_journal()
+                self._drop_torn_tail()
+            self._rebuild_ranking()
+        # 启动时把日志合并进快照，避免日志无限增长
+        if compact and self.journal_count:
+            self.compact()
+
+    def _snapshot_signature(self):
+        """快照文件的 (mtime, 大小, inode)，文件被替换后会变化"""
+        try:
+            st = os.stat(self.filename)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程的排他文件锁（锁文件与排行榜同名，扩展名为 .lock）"""
+        with open(self.lock_filename, 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue  # LK_LOCK 重试 10 秒后仍拿不到锁会抛异常，继续等待
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _sync(self):
+        """持有文件锁时调用：把其他进程写入的变化合并进内存"""
+        if self._snapshot_signature() != self.snapshot_signature:
+            # 其他进程压缩过快照（日志已被清空），只能整体重新加载
+            self._load(compact=False)
+            return
+        records, self.journal_offset = self._read_journal(self.journal_offset)
+        with self.lock:
+            for record in records:
+                self._update_rank(self._merge_record(record))
+            self.journal_count += len(records)
+
+    def refresh(self):
+        """共享模式下读取前调用：快照或日志有变化时才加锁同步 (无变化时只需两次 stat)"""
+        if not self.shared:
+            return
+        try:
+            journal_size = os.path.getsize(self.journal_filename)
+        except OSError:
+            journal_size = 0
+        if journal_size == self.journal_offset and self._snapshot_signature() == self.snapshot_signature:
+            return
+        with self.io_lock, self._file_lock():
+            self._sync()
+
+    def _rebuild_index(self):
+        """根据 self.data 重建 (班级, 姓名) 索引"""
+        self.index = {}
+        for entry in self.data:
+            # 与原先线性查找一致：重复记录以第一条为准
+            self.index.setdefault(entry.key, entry)
+
+    def _rebuild_ranking(self):
+        """对全部记录排序一次，建立有序排名表和各班级的排名表、汇总"""
+        self.rank_keys = {}
+        self.class_totals = {}
+        self.contributions = {}
+        for seq, entry in enumerate(self.data):
+            key = entry.key
+            if self.index.get(key) is not entry:
+                continue
+            passed_modules, avg_attempts = self.calculate_score(entry)
+            self.rank_keys[key] = (-passed_modules, avg_attempts, seq) + key
+            self._add_contribution(entry)
+        self.next_seq = len(self.data)
+        self.ranking = sorted(self.rank_keys.values())
+        self.class_rankings = defaultdict(list)
+        for rank_key in self.ranking:
+            self.class_rankings[rank_key[3]].append(rank_key)
+
+    @staticmethod
+    def _remove_sorted(ranking, rank_key):
+        """从有序排名表中删除一个元素 (二分查找)"""
+        pos = bisect.bisect_left(ranking, rank_key)
+        if pos < len(ranking) and ranking[pos] == rank_key:
+            del ranking[pos]
+
+    def _add_contribution(self, entry):
+        """把玩家当前成绩计入班级汇总"""
+        totals = self.class_totals.setdefault(entry.class_name, {
+            'players': 0, 'success': [0] * len(MODULES), 'attempts': [0] * len(MODULES)})
+        contribution = (tuple(entry.success), tuple(attempts or 0 for attempts in entry.attempts))
+        totals['players'] += 1
+        for i in range(len(MODULES)):
+            totals['success'][i] += contribution[0][i]
+            totals['attempts'][i] += contribution[1][i]
+        self.contributions[entry.key] = contribution
+
+    def _remove_contribution(self, key):
+        """把玩家之前计入的成绩从班级汇总中扣除"""
+        contribution = self.contributions.pop(key, None)
+        if contribution is None:
+            return
+        totals = self.class_totals[key[0]]
+        totals['players'] -= 1
+        for i in range(len(MODULES)):
+            totals['success'][i] -= contribution[0][i]
+            totals['attempts'][i] -= contribution[1][i]
+        if totals['players'] == 0:
+            del self.class_totals[key[0]]
+
+    def _remove_rank(self, key):
+        """把玩家从全局排名表、班级排名表和班级汇总中移除，返回原来的排名元素"""
+        old_rank_key = self.rank_keys.pop(key, None)
+        if old_rank_key is not None:
+            self._remove_sorted(self.ranking, old_rank_key)
+            class_ranking = self.class_rankings.get(key[0])
+            if class_ranking is not None:
+                self._remove_sorted(class_ranking, old_rank_key)
+                if not class_ranking:
+                    del self.class_rankings[key[0]]
+        self._remove_contribution(key)
+        return old_rank_key
+
+    def _update_rank(self, entry):
+        """成绩变化后，把该玩家从排名表中删除再按新成绩插入 (二分查找 O(log n))，同时更新班级汇总"""
+        key = entry.key
+        old_rank_key = self._remove_rank(key)
+        if old_rank_key is not None:
+            seq = old_rank_key[2]
+        else:
+            seq = self.next_seq
+            self.next_seq += 1
+        passed_modules, avg_attempts = self.calculate_score(entry)
+        new_rank_key = (-passed_modules, avg_attempts, seq) + key
+        self.rank_keys[key] = new_rank_key
+        bisect.insort(self.ranking, new_rank_key)
+        bisect.insort(self.class_rankings[entry.class_name], new_rank_key)
+        self._add_contribution(entry)
+
+    def _replay_journal(self):
+        """重放日志：每条记录是某个玩家更新后的完整一行，按 (班级, 姓名) 覆盖快照中的记录"""
+        records, self.journal_offset = self._read_journal()
+        for record in records:
+            self._merge_record(record)
+        self.journal_count = len(records)
+
+    def _drop_torn_tail(self):
+        """崩溃时日志末尾可能留下写了一半的行：截掉最后一个换行之后的内容，
+        否则下一次追加会接在这半行后面，拼成字段数不对的一行而在重放时被丢弃"""
+        try:
+            with open(self.journal_filename, 'r+b') as f:
+                f.seek(self.journal_offset)
+                tail = f.read()
+                # 只有剩下的是不含换行的半行时才截断（读取日志出错时 journal_offset 不可信，不动文件）
+                if tail and b'\n' not in tail:
+                    f.truncate(self.journal_offset)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error truncating leaderboard journal: {e}")
+
+    def _read_journal(self, offset=0):
+        """从第 offset 字节起读取日志，返回 (记录列表, 新的 offset)；只消费以换行结尾的完整行"""
+        records = []
+        try:
+            with open(self.journal_filename, 'rb') as f:
+                f.seek(offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return records, 0
+        except Exception as e:
+            print(f"Error replaying leaderboard journal: {e}")
+            return records, offset
+        end = chunk.rfind(b'\n') + 1
+        for row in csv.reader(chunk[:end].decode('utf-8', errors='replace').splitlines()):
+            # 崩溃时某一行可能只写了一半，字段数不对的直接丢弃
+            if len(row) != len(self.FIELDNAMES):
+                continue
+            records.append(ScoreRecord.from_row(dict(zip(self.FIELDNAMES, row))))
+        return records, offset + end
+
+    def _merge_record(self, record):
+        """用日志中的一条记录覆盖（或新增）内存中的记录，返回内存中的记录"""
+        entry = self.index.get(record.key)
+        if entry is not None:
+            entry.copy_from(record)
+            return entry
+        self.index[record.key] = record
+        self.data.append(record)
+        return record
+
+    def _append_journal(self, rows):
+        """把若干条更新后的记录一次性追加到日志文件 (写入量只与本次更新条数有关)"""
+        try:
+            with self.io_lock:
+                with open(self.journal_filename, 'a', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerows(rows)
+                self.journal_count += len(rows)
+                if self.shared:
+                    # 写入前已在文件锁内同步到日志末尾，追加后的文件大小就是新的 offset
+                    self.journal_offset = os.path.getsize(self.journal_filename)
+        except Exception as e:
+            print(f"Error appending leaderboard journal: {e}")
+            # 追加失败时退回到整体保存
+            self.save()
+            return
+        if self.journal_count >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """把内存中的数据写成新快照，然后清空日志"""
+        with self.io_lock:
+            if self.save():
+                try:
+                    open(self.journal_filename, 'w', encoding='utf-8').close()
+                    self.journal_count = 0
+                    self.journal_offset = 0
+                except Exception as e:
+                    print(f"Error truncating leaderboard journal: {e}")
 
     def save(self):
-        """将排行榜数据保存到CSV文件"""
+        """将排行榜数据保存到CSV文件（先写临时文件再替换，避免写到一半时文件被截断）"""
         try:
-            # 确保所有记录都有相同的字段
-            fieldnames = ['timestamp', 'class', 'name', '猜铁_success', '猜铁_attempts', '国景_success', '国景_attempts', '填国1_success', '填国1_attempts', '填国2_success', '填国2_attempts', '填国3_success', '填国3_attempts']
-            
-            # 确保每个记录都有所有字段
-            for entry in self.data:
-                for field in fieldnames:
-                    if field not in entry:
-                        if field.endswith('_success'):
-                            entry[field] = '0'
-                        elif field.endswith('_attempts'):
-                            entry[field] = '0'
-                        elif field == 'timestamp' and 'timestamp' not in entry:
-                            entry[field] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            with open(self.filename, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                for entry in self.data:
-                    writer.writerow(entry)
+            with self.io_lock:
+                with self.lock:
+                    rows = [entry.to_row() for entry in self.data]
+                tmp_filename = self.filename + '.tmp'
+                with open(tmp_filename, 'w', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(self.FIELDNAMES)
+                    writer.writerows(rows)
+                os.replace(tmp_filename, self.filename)
+                self.snapshot_signature = self._snapshot_signature()
+            return True
         except Exception as e:
             print(f"Error saving leaderboard: {e}")
+            return False
+
+    def get_entry(self, class_name, student_name):
+        """按班级和姓名查找玩家记录，不存在时返回 None (O(1))"""
+        self.refresh()
+        return self.index.get((class_name, student_name))
+
+    def remove_entry(self, class_name, student_name):
+        """删除玩家记录，返回是否删除成功"""
+        if self.shared:
+            with self.io_lock, self._file_lock():
+                self._sync()
+                return self._remove_entry(class_name, student_name)
+        return self._remove_entry(class_name, student_name)
+
+    def _remove_entry(self, class_name, student_name):
+        with self.lock:
+            entry = self.index.pop((class_name, student_name), None)
+            if entry is None:
+                return False
+            self.data.remove(entry)
+            self.dirty.discard((class_name, student_name))
+            self._remove_rank((class_name, student_name))
+        # 删除无法用追加日志表示，直接写新快照
+        if self.journal:
+            self.compact()
+        else:
+            self.save()
+        return True
 
     def _find_entry(self, class_name, student_name):
         """辅助方法：查找或创建玩家记录"""
-        for entry in self.data:
-            if entry.get('class') == class_name and entry.get('name') == student_name:
-                return entry
+        entry = self.index.get((class_name, student_name))
+        if entry is not None:
+            return entry
         
-        # 如果未找到，创建新记录并初始化所有字段
-        new_entry = {
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'class': class_name,
-            'name': student_name,
-            '猜铁_success': '0',
-            '猜铁_attempts': '0',
-            '国景_success': '0',
-            '国景_attempts': '0',
-            '填国1_success': '0',
-            '填国1_attempts': '0',
-            '填国2_success': '0',
-            '填国2_attempts': '0',
-            '填国3_success': '0',
-            '填国3_attempts': '0',
-        }
+        # 如果未找到，创建新记录（所有计数初始化为0）
+        new_entry = ScoreRecord(class_name, student_name)
         self.data.append(new_entry)
+        self.index[(class_name, student_name)] = new_entry
         return new_entry
 
     def add_score(self, class_name, student_name, module_name, success, attempts, answer=None):
         """添加或更新特定模块的成绩到排行榜"""
-        
-        entry = self._find_entry(class_name, student_name)
-
-        success_key = f"{module_name}_success"
-        attempts_key = f"{module_name}_attempts"
-
-        # --- 获取旧值 ---
-        old_success = entry.get(success_key, '0')
-        old_attempts = entry.get(attempts_key, '0')
-
-        try:
-            current_success = int(old_success)
-            current_attempts = int(old_attempts)
-        except ValueError:
-            # 如果旧值不是数字（例如 'N/A'），则重置为0
-            current_success = 0
-            current_attempts = 0
-
-        # --- 计算新值 ---
-        if module_name == "猜铁" or module_name == "国景":
-            if success:
-                # 成功：总题数 + 1，总尝试次数 + 本轮尝试次数
-                new_success = current_success + 1
-                new_attempts = current_attempts + attempts
-            else:
-                # 失败：总题数不变，总尝试次数 + 本轮尝试次数
-                new_success = current_success
-                new_attempts = current_attempts + attempts
-
-            # --- 更新 entry ---
-            entry[success_key] = str(new_success)
-            entry[attempts_key] = str(new_attempts)
-
-            # 更新时间戳
-            entry['timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
+        if self.shared:
+            # 共享模式：在文件锁内先合并其他进程的更新，再把本次更新追加到日志
+            with self.io_lock, self._file_lock():
+                self._sync()
+                self._add_score(class_name, student_name, module_name, success, attempts)
+            return
+        if self.journal and not self.write_behind:
+            # 日志模式：更新内存和追加日志都在 io_lock 内完成，同一玩家的并发更新按更新顺序写进日志
+            with self.io_lock:
+                self._add_score(class_name, student_name, module_name, success, attempts)
+            return
+        self._add_score(class_name, student_name, module_name, success, attempts)
+
+    def _add_score(self, class_name, student_name, module_name, success, attempts):
+        with self.lock:
+            entry = self._find_entry(class_name, student_name)
+
+            entry.apply_result(module_name, success, attempts)
+            print(datetime.now().strftime('%Y-%m-%d %H:%M:%S')+' '+class_name+student_name+" Update leaderboard: "+module_name+" -> "+"success = "+str(success)+" attempts = "+str(attempts))
+            self._update_rank(entry)
+            if self.write_behind:
+                # 延迟写入模式：只标记为脏记录，攒够 flush_every 次更新时提前唤醒后台线程
+                self.dirty.add(entry.key)
+                self.pending_updates += 1
+                if self.pending_updates >= self.flush_every:
+                    self.flush_cond.notify()
+                return
+            row = entry.to_row()
+        if self.journal:
+            # 日志模式：只追加这一条记录
+            self._append_journal([row])
         else:
-            entry['timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            if success:
-                entry[success_key] = "1"
-                entry[attempts_key] = str(attempts)
+            # 保存到CSV文件
+            self.save()
+
+    def _flush_loop(self):
+        """后台写盘线程：等待 flush_interval_ms 毫秒或 flush_every 次更新后写盘，关闭时最后写一次"""
+        while True:
+            with self.flush_cond:
+                if not self.closed and self.pending_updates < self.flush_every:
+                    self.flush_cond.wait(self.flush_interval_ms / 1000)
+                closing = self.closed
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing leaderboard: {e}")
+            if closing:
+                return
+
+    def flush(self):
+        """把脏记录写盘（日志模式追加这些记录，否则重写快照），返回写入的记录数"""
+        with self.io_lock:
+            with self.lock:
+                keys = self.dirty
+                self.dirty = set()
+                self.pending_updates = 0
+                rows = [self.index[key].to_row() for key in keys if key in self.index]
+            if not rows:
+                return 0
+            start = time.perf_counter()
+            if self.journal:
+                self._append_journal(rows)
             else:
-                entry[success_key] = '0'
-                entry[attempts_key] = "N/A"
-            print(f"DEBUG: After update - {success_key}: {entry[success_key]}, {attempts_key}: {entry[attempts_key]}")
-        # 保存到CSV文件
-        print(datetime.now().strftime('%Y-%m-%d %H:%M:%S')+' '+class_name+student_name+" Update leaderboard: "+module_name+" -> "+"success = "+str(success)+" attempts = "+str(attempts))
-        self.save()
-
-    def get_all_scores(self):
-        """获取所有成绩，按通过题数降序，平均尝试次数升序排序"""
-        def calculate_score(entry):
-            passed_modules = 0
-            total_attempts_for_avg = 0
-            successful_games_for_avg = 0
-            
-            for module in ['猜铁', '国景', '填国1', '填国2', '填国3']:
-                success_key = f"{module}_success"
-                attempts_key = f"{module}_attempts"
-                
-                try:
-                    success_val = int(entry.get(success_key, 0))
-                    attempts_val = int(entry.get(attempts_key, 0))
-                except (ValueError, TypeError):
-                    success_val = 0
-                    attempts_val = 0
-                
-                passed_modules += success_val
-                
-                # 计算平均尝试次数（只针对猜铁和国景）
-                if module in ['猜铁', '国景'] and success_val > 0:
-                    successful_games_for_avg += success_val
-                    total_attempts_for_avg += attempts_val
-            
-            avg_attempts = 0
-            if successful_games_for_avg > 0:
-                avg_attempts = total_attempts_for_avg / successful_games_for_avg
-            
-            # print(passed_modules)
-            return passed_modules, avg_attempts
+                self.save()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.flush_stats['flushes'] += 1
+            self.flush_stats['records'] += len(rows)
+            self.flush_stats['last_ms'] = elapsed_ms
+            self.flush_stats['max_ms'] = max(self.flush_stats['max_ms'], elapsed_ms)
+        return len(rows)
+
+    def close(self):
+        """停止后台写盘线程并写出剩余的脏记录（进程退出时自动调用）"""
+        with self.flush_cond:
+            if self.closed:
+                return
+            self.closed = True
+            self.flush_cond.notify()
+        if self.flush_thread is not None:
+            self.flush_thread.join()
+        else:
+            self.flush()
+
+    def get_flush_stats(self):
+        """返回写盘统计：写盘次数、写出的记录数、最近/最长一次耗时（毫秒）和待写盘记录数"""
+        with self.lock:
+            stats = dict(self.flush_stats)
+            stats['pending'] = len(self.dirty)
+        return stats
+
+    @staticmethod
+    def calculate_score(entry):
+        """计算一条记录的 (通过题数, 平均尝试次数)"""
+        passed_modules = sum(entry.success)
         
-        # 一次性排序：先按通过题数降序，再按平均尝试次数升序
+        # 计算平均尝试次数（只针对猜铁和国景）
+        successful_games_for_avg = 0
+        total_attempts_for_avg = 0
+        for module in ['猜铁', '国景']:
+            i = MODULE_INDEX[module]
+            if entry.success[i] > 0:
+                successful_games_for_avg += entry.success[i]
+                total_attempts_for_avg += entry.attempts[i] or 0
         
+        avg_attempts = 0
+        if successful_games_for_avg > 0:
+            avg_attempts = total_attempts_for_avg / successful_games_for_avg
         
-        sorted_data = sorted(self.data, 
-                            key=lambda x: (-calculate_score(x)[0], calculate_score(x)[1]))
-        return sorted_data
-
-    def get_paginated_scores(self, page, per_page=10):
-        """获取分页后的排行榜数据"""
-        all_scores = self.get_all_scores()
-        start = (page - 1) * per_page
+        return passed_modules, avg_attempts
+
+    def get_all_scores(self):
+        """获取所有成绩，按通过题数降序，平均尝试次数升序排序（直接读取有序排名表）"""
+        self.refresh()
+        with self.lock:
+            return [self.index[rank_key[3:]] for rank_key in self.ranking]
+
+    def get_paginated_scores(self, page, per_page=10, class_name=None):
+        """获取分页后的排行榜数据，只取出当前页的 per_page 条；指定 class_name 时只看该班级"""
+        per_page = max(per_page, 1)
+        start = max((page - 1) * per_page, 0)
         end = start + per_page
-        paginated_scores = all_scores[start:end]
-        total_pages = (len(all_scores) + per_page - 1) // per_page  # 向上取整计算总页数
+        self.refresh()
+        with self.lock:
+            ranking = self.ranking if class_name is None else self.class_rankings.get(class_name, [])
+            paginated_scores = [self.index[rank_key[3:]] for rank_key in ranking[start:end]]
+            total_pages = (len(ranking) + per_page - 1) // per_page  # 向上取整计算总页数
         return paginated_scores, total_pages
 
-# --- 上海地铁图类 ---
-class ShanghaiMetroGraph:
-    """上海地铁网络图"""
-    
-    def __init__(self):
-        # 初始化数据结构
-        self.stations = {}  # 站点信息
-        self.lines = {}     # 线路信息
-        self.graph = defaultdict(list)  # 邻接表表示的地铁网络
-        self.station_lines = defaultdict(set)  # 站点对应的线路
-        self.station_nodes = {}  # 站点节点映射（支持同站不同线）
-        
-        # 用于存储预计算的最短距离和换乘次数
-        self.shortest_routes = {}
-        self.minimum_changes = {}
-        
-        # 初始化数据
-        self.load_stations()
-        self.load_distances_and_changes()
-
-    def load_distances_and_changes(self):
-        """加载预计算的最短距离和最少换乘次数"""
-        # 加载最短站数
+    def get_class_names(self):
+        """获取所有有成绩的班级"""
+        self.refresh()
+        with self.lock:
+            return sorted(self.class_rankings)
+
+    def get_top_per_class(self, n=3):
+        """获取每个班级的前 n 名 {班级: [记录, ...]}"""
+        self.refresh()
+        with self.lock:
+            return {class_name: [self.index[rank_key[3:]] for rank_key in ranking[:n]]
+                    for class_name, ranking in sorted(self.class_rankings.items())}
+
+    def get_class_summary(self, class_name):
+        """获取班级汇总：人数，以及各模块的人均通过题数和平均尝试次数（尝试次数之和 / 通过题数之和）"""
+        self.refresh()
+        with self.lock:
+            totals = self.class_totals.get(class_name)
+            if totals is None:
+                return None
+            return summarize_class(class_name, totals['players'], totals['success'], totals['attempts'])
+
+class SQLiteLeaderboard:
+    """基于 SQLite 的排行榜，接口与 Leaderboard 相同
+
+    使用 WAL 模式，多个 gunicorn 进程可以同时读写同一个数据库文件；
+    排名所需的 (通过题数, 平均尝试次数) 在写入时算好并建立索引，分页直接交给 LIMIT/OFFSET。
+    """
+    SCORE_COLUMNS = Leaderboard.FIELDNAMES[3:]
+
+    def __init__(self, filename='Leaderboard.db', import_from=None):
+        self.filename = filename
+        self.local = threading.local()  # sqlite3 连接不能跨线程共享，每个线程各开一个
+        conn = self._connect()
+        with conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            score_columns = ', '.join(f'"{column}" INTEGER' for column in self.SCORE_COLUMNS)
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS scores (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp REAL NOT NULL,
+                    class TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    {score_columns},
+                    passed INTEGER NOT NULL DEFAULT 0,
+                    avg_attempts REAL NOT NULL DEFAULT 0
+                )""")
+            conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_scores_player ON scores (class, name)')
+            # id 作为同分时的次序，与 Leaderboard 按加入顺序的稳定排序一致
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_scores_rank ON scores (passed DESC, avg_attempts, id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_scores_class_rank ON scores (class, passed DESC, avg_attempts, id)')
+        if import_from:
+            self.import_csv(import_from)
+
+    def _connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            # 自行控制事务（BEGIN IMMEDIATE），超时等待其他进程释放写锁
+            conn = sqlite3.connect(self.filename, timeout=30, isolation_level=None)
+            self.local.conn = conn
+        return conn
+
+    def _row_to_record(self, row):
+        record = ScoreRecord(row[1], row[2], row[0])
+        values = row[3:]
+        record.success = list(values[0::2])
+        record.attempts = list(values[1::2])
+        return record
+
+    def _select(self, where=''):
+        columns = ', '.join(['timestamp', 'class', 'name'] + [f'"{column}"' for column in self.SCORE_COLUMNS])
+        return f'SELECT {columns} FROM scores {where}'
+
+    def _write_record(self, conn, record):
+        """插入或覆盖一条记录（调用方负责事务）"""
+        passed_modules, avg_attempts = Leaderboard.calculate_score(record)
+        values = []
+        for success, attempts in zip(record.success, record.attempts):
+            values.append(success)
+            values.append(attempts)
+        columns = ['timestamp', 'class', 'name'] + [f'"{column}"' for column in self.SCORE_COLUMNS] + ['passed', 'avg_attempts']
+        updates = ', '.join(f'{column} = excluded.{column}' for column in columns if column not in ('class', 'name'))
+        conn.execute(
+            f'INSERT INTO scores ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))}) '
+            f'ON CONFLICT (class, name) DO UPDATE SET {updates}',
+            [record.timestamp, record.class_name, record.name] + values + [passed_modules, avg_attempts])
+
+    def import_csv(self, csv_filename='Leaderboard.csv'):
+        """一次性把现有的 Leaderboard.csv（连同日志中尚未压缩的更新）导入空数据库，返回导入的记录数；
+        数据库已有数据时不做任何事"""
+        journal_filename = os.path.splitext(csv_filename)[0] + '.journal'
+        if not os.path.exists(csv_filename) and not os.path.exists(journal_filename):
+            return 0
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
         try:
-            with open('data/ShortestRoute.csv', 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                header = next(reader)  # 第一行是站名
-                stations = [row[0] for row in reader] # 获取所有站名
-                f.seek(0) # 重置文件指针
-                next(reader) # 跳过标题行
-                for i, row in enumerate(reader):
-                    from_station = header[i + 1] # 第一列是站名，所以取 i+1
-                    for j, value in enumerate(row[1:]): # 跳过第一列
-                        to_station = stations[j]
-                        if from_station not in self.shortest_routes:
-                            self.shortest_routes[from_station] = {}
-                        self.shortest_routes[from_station][to_station] = int(value)
-        except FileNotFoundError:
-            print("Warning: data/ShortestRoute.csv not found. Calculating distances will fail.")
+            if conn.execute('SELECT 1 FROM scores LIMIT 1').fetchone():
+                conn.execute('ROLLBACK')
+                return 0
+            # 用日志模式的 Leaderboard 读取：快照之后只写进日志的更新也会被重放（并压缩进快照）
+            source = Leaderboard(csv_filename, journal=True)
+            count = 0
+            for record in source.data:
+                # 与 Leaderboard 一致：重复记录以第一条为准
+                if source.index.get(record.key) is not record:
+                    continue
+                self._write_record(conn, record)
+                count += 1
+            conn.execute('COMMIT')
+            return count
         except Exception as e:
-            print(f"Error loading shortest routes: {e}")
+            conn.execute('ROLLBACK')
+            print(f"Error importing leaderboard: {e}")
+            return 0
+
+    def get_entry(self, class_name, student_name):
+        """按班级和姓名查找玩家记录，不存在时返回 None"""
+        query = self._select('WHERE class = ? AND name = ?')
+        row = self._connect().execute(query, (class_name, student_name)).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def remove_entry(self, class_name, student_name):
+        """删除玩家记录，返回是否删除成功"""
+        conn = self._connect()
+        cursor = conn.execute('DELETE FROM scores WHERE class = ? AND name = ?', (class_name, student_name))
+        return cursor.rowcount > 0
 
-        # 加载最少换乘次数
+    def add_score(self, class_name, student_name, module_name, success, attempts, answer=None):
+        """添加或更新特定模块的成绩到排行榜（读-改-写在同一个写事务内，多进程并发也不会互相覆盖）"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
         try:
-            with open('data/MinimumChange.csv', 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                header = next(reader)  # 第一行是站名
-                stations = [row[0] for row in reader] # 获取所有站名
-                f.seek(0) # 重置文件指针
-                next(reader) # 跳过标题行
-                for i, row in enumerate(reader):
-                    from_station = header[i + 1] # 第一列是站名，所以取 i+1
-                    for j, value in enumerate(row[1:]): # 跳过第一列
-                        to_station = stations[j]
-                        if from_station not in self.minimum_changes:
-                            self.minimum_changes[from_station] = {}
-                        self.minimum_changes[from_station][to_station] = int(value)
-        except FileNotFoundError:
-            print("Warning: data/MinimumChange.csv not found. Calculating transfers will fail.")
-        except Exception as e:
-            print(f"Error loading minimum changes: {e}")
+            query = self._select('WHERE class = ? AND name = ?')
+            row = conn.execute(query, (class_name, student_name)).fetchone()
+            entry = self._row_to_record(row) if row else ScoreRecord(class_name, student_name)
+            entry.apply_result(module_name, success, attempts)
+            self._write_record(conn, entry)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        print(datetime.now().strftime('%Y-%m-%d %H:%M:%S')+' '+class_name+student_name+" Update leaderboard: "+module_name+" -> "+"success = "+str(success)+" attempts = "+str(attempts))
 
+    calculate_score = staticmethod(Leaderboard.calculate_score)
 
-    def load_stations(self):
-        """加载上海地铁站点数据"""
-        try:
-            with open('data/StationInfo.csv', 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    name = row['站名']
-                    district = row['区县']
-                    # 解析线路，非空值才加入列表
-                    lines = [row[f'线路{i}'] for i in range(1, 6) if row[f'线路{i}']]
-                    try:
-                        opening_year = int(row['开通年份']) if row['开通年份'] else 0
-                    except ValueError:
-                        opening_year = 0 # 如果年份不是数字，则设为0
-
-                    # 存储站点信息
-                    self.stations[name] = {
-                        "district": district,
-                        "lines": lines,
-                        "opening_year": opening_year
-                    }
-                    
-        except FileNotFoundError:
-            print("Error: data/StationInfo.csv not found.")
-        except Exception as e:
-            print(f"Error loading station info: {e}")
-    
-    def calculate_min_stations(self, start_station: str, end_station: str) -> int:
-        """计算最小站数 - 从预加载的CSV数据中获取"""
-        if start_station in self.shortest_routes and end_station in self.shortest_routes[start_station]:
-            return self.shortest_routes[start_station][end_station]
-        else:
-            return 100
-
-    def calculate_min_transfers(self, start_station: str, end_station: str) -> int:
-        """计算最小换乘次数 - 从预加载的CSV数据中获取"""
-        if start_station in self.minimum_changes and end_station in self.minimum_changes[start_station]:
-            return self.minimum_changes[start_station][end_station]
+    def get_all_scores(self):
+        """获取所有成绩，按通过题数降序，平均尝试次数升序排序"""
+        query = self._select('ORDER BY passed DESC, avg_attempts, id')
+        return [self._row_to_record(row) for row in self._connect().execute(query)]
+
+    def get_paginated_scores(self, page, per_page=10, class_name=None):
+        """获取分页后的排行榜数据，由数据库按索引顺序 LIMIT/OFFSET 取出当前页；指定 class_name 时只看该班级"""
+        per_page = max(per_page, 1)
+        start = max((page - 1) * per_page, 0)
+        conn = self._connect()
+        if class_name is None:
+            where, params = '', ()
         else:
-            return 10
-
-
-    def get_all_stations(self) -> List[str]:
-        """获取所有站点列表"""
-        return sorted(list(self.stations.keys()))
-    
-    def get_station_info(self, station_name: str) -> Dict:
-        """获取站点信息"""
-        return self.stations.get(station_name, {})
+            where, params = 'WHERE class = ?', (class_name,)
+        query = self._select(f'{where} ORDER BY passed DESC, avg_attempts, id LIMIT ? OFFSET ?')
+        paginated_scores = [self._row_to_record(row) for row in conn.execute(query, params + (per_page, start))]
+        total = conn.execute(f'SELECT COUNT(*) FROM scores {where}', params).fetchone()[0]
+        total_pages = (total + per_page - 1) // per_page  # 向上取整计算总页数
+        return paginated_scores, total_pages
 
-# 初始化地铁图
-metro_graph = ShanghaiMetroGraph()
-# 初始化排行榜
-leaderboard = Leaderboard()
+    def get_class_names(self):
+        """获取所有有成绩的班级"""
+        return [row[0] for row in self._connect().execute('SELECT DISTINCT class FROM scores ORDER BY class')]
+
+    def get_top_per_class(self, n=3):
+        """获取每个班级的前 n 名 {班级: [记录, ...]}"""
+        conn = self._connect()
+        query = self._select('WHERE class = ? ORDER BY passed DESC, avg_attempts, id LIMIT ?')
+        return {class_name: [self._row_to_record(row) for row in conn.execute(query, (class_name, n))]
+                for class_name in self.get_class_names()}
+
+    def get_class_summary(self, class_name):
+        """获取班级汇总：人数，以及各模块的人均通过题数和平均尝试次数（尝试次数之和 / 通过题数之和）"""
+        sums = ', '.join(f'SUM("{module}_success"), SUM(COALESCE("{module}_attempts", 0))' for module in MODULES)
+        row = self._connect().execute(f'SELECT COUNT(*), {sums} FROM scores WHERE class = ?', (class_name,)).fetchone()
+        if not row[0]:
+            return None
+        return summarize_class(class_name, row[0], list(row[1::2]), list(row[2::2]))
+
+# 初始化地铁图：设置了 METRO_LOW_MEMORY 时不把距离矩阵整个读进内存
+metro_graph = ShanghaiMetroGraph(low_memory=bool(os.environ.get('METRO_LOW_MEMORY')))
+metro_graph.warm_up()
+# 初始化排行榜：设置了 LEADERBOARD_DB 时使用 SQLite（多进程部署），首次启动自动导入 CSV；
+# 设置了 LEADERBOARD_SHARED 时使用加文件锁的共享 CSV 排行榜（多进程部署）；
+# 否则使用日志模式 + 后台延迟写盘的 CSV 排行榜
+if os.environ.get('LEADERBOARD_DB'):
+    leaderboard = SQLiteLeaderboard(os.environ['LEADERBOARD_DB'], import_from='Leaderboard.csv')
+elif os.environ.get('LEADERBOARD_SHARED'):
+    leaderboard = Leaderboard(shared=True)
+else:
+    leaderboard = Leaderboard(journal=True, write_behind=True)
 
 try:
     from calculator import bearing, dist, latlongbrng
@@ -340,30 +858,56 @@ except ImportError:
     fill_guo_problems = []
     
 def build_nation_lookup():
-    """构建国家名称查找字典 {name.lower(): {'zh_name': str, 'coords': list}}"""
-    lookup = {}
-    for nation_info in nation_template:
+    """构建国家名称索引：英文、中文、日文名称规范化后都能查到 {'zh_name': str, 'coords': list, 'index': int}
+
+    nation_lookup.get(名称) 大小写、全半角、平/片假名、’ 与 ' 等写法差异都不影响结果；
+    nation_lookup.complete(前缀) 用于输入补全。
+    """
+    names_per_nation, values = [], []
+    for index, nation_info in enumerate(nation_template):
+        names = []
         if nation_info and len(nation_info) > 3:
             # 假设 nation_info 格式为 [ [en_names], [zh_names], [other_names], [lat, lon] ]
-            # 将所有名称列表合并
-            all_names = []
-            for name_list in nation_info[:2]: # 取前三个列表（英文、中文、其他）
+            for name_list in nation_info[:3]: # 取前三个列表（英文、中文、日文）
                 if isinstance(name_list, list):
-                    all_names.extend(name_list)
-            coords = nation_info[3]
-
-            # 获取首选中文名（通常是列表第一个）
-            zh_name = nation_info[1][0] if nation_info[1] else "未知国家"
-
-            # 为每个名称创建映射
-            for name in all_names:
-                if isinstance(name, str) and name.strip():
-                    lookup[name.lower()] = {'zh_name': zh_name, 'coords': coords}
-    return lookup
+                    names.extend(name_list)
+        # 获取首选中文名（通常是列表第一个）
+        zh_name = nation_info[1][0] if nation_info and len(nation_info) > 1 and nation_info[1] else "未知国家"
+        names_per_nation.append(names)
+        values.append({'zh_name': zh_name, 'coords': nation_info[3] if names else None, 'index': index})
+    return NameIndex(names_per_nation, values)
 
 # 构建查找字典
 nation_lookup = build_nation_lookup()
 
+try:
+    import geo
+except ImportError:
+    print("Warning: geo.py not found. Distances will be computed with calculator.py.")
+    geo = None
+
+# 预计算各国首都和各题目坐标的单位向量，以及所有 (题目, 国家) 组合的距离和方向，国景每次猜测只需查表
+if geo is not None:
+    nation_points = geo.point_table([nation_info[3] for nation_info in nation_template])
+    problem_points = geo.point_table([problem[2] for problem in problem_set])
+    guess_matrix = geo.GuessMatrix(nation_points, problem_points)
+    # 首都的球树，用于提示和干扰项：某个位置最近的几个首都、某个位置一定范围内的首都
+    nation_tree = geo.BallTree(nation_points)
+
+def nearest_nations(coords, k=5):
+    """离 coords 最近的 k 个国家首都，返回 [(国家中文名, 距离千米), ...]，由近到远；没有 geo.py 时返回空列表"""
+    if geo is None:
+        return []
+    return [(nation_template[i][1][0], round(distance))
+            for i, distance in nation_tree.nearest(geo.GeoPoint(coords), k)]
+
+def nations_within(coords, radius):
+    """首都离 coords 不超过 radius 千米的所有国家，返回 [(国家中文名, 距离千米), ...]，由近到远；没有 geo.py 时返回空列表"""
+    if geo is None:
+        return []
+    return [(nation_template[i][1][0], round(distance))
+            for i, distance in nation_tree.within(geo.GeoPoint(coords), radius)]
+
 def validate_fill_guo_grid(problem_id, grid):
     # print(grid)
     flat_grid = []
@@ -451,9 +995,10 @@ def start_game(game_type):
     print(datetime.now().strftime('%Y-%m-%d %H:%M:%S')+' '+str(session.get('class','test'))+str(session.get('name','test'))+" Entered "+game_type)
     
     if game_type == 'metro_guess':
-        # 随机选择答案
+        # 随机选择答案：?level=easy / hard 时按难度加权抽取，否则均匀抽取
         all_stations = metro_graph.get_all_stations()
-        answer = random.choice(all_stations)
+        answer = metro_graph.sample_answer(request.args.get('level'))
+        metro_graph.route_vectors(answer)  # 预先取出到答案站的距离向量，之后每次猜测直接按下标取值
         
         session['game_type'] = 'metro_guess'
         session['answer'] = answer
@@ -478,7 +1023,8 @@ def start_game(game_type):
         if not problem_set:
             return "没有可用的题目", 500
         
-        problem = random.choice(problem_set)
+        problem_index = random.randrange(len(problem_set))
+        problem = problem_set[problem_index]
         nation_index = problem[0]
         image_filename = problem[1]
         target_coords = problem[2]
@@ -497,6 +1043,7 @@ def start_game(game_type):
         session['answer_nation_name'] = correct_nation_name
         session['answer_nation_zh_name'] = correct_nation_zh_name # 存储中文名
         session['answer_coords'] = target_coords
+        session['problem_index'] = problem_index
         session['image_filename'] = image_filename
         session['guesses'] = [] # 重置猜测记录
         session['attempts'] = 0 # 重置尝试次数
@@ -598,18 +1145,11 @@ def submit_guess():
     # 计算最小站数和换乘次数 (现在从CSV数据获取)
     min_stations = metro_graph.calculate_min_stations(guess, answer)
     min_transfers = metro_graph.calculate_min_transfers(guess, answer)
+    # 所有非劣的 (站数, 换乘次数)，"最少站数"和"最少换乘"不是同一条路线时前端可以分别提示
+    route_options = metro_graph.route_options(guess, answer)
     
-    # 线路比较
-    guess_lines = set(guess_info.get('lines', []))
-    answer_lines = set(answer_info.get('lines', []))
-    intersection = guess_lines & answer_lines
-    
-    if guess_lines == answer_lines:
-        lines_match = 'perfect'  # 完全正确
-    elif intersection:
-        lines_match = 'partial'  # 部分正确
-    else:
-        lines_match = 'none'     # 完全不匹配
+    # 线路比较（位集运算）：perfect 完全正确，partial 部分正确，none 完全不匹配
+    lines_match = metro_graph.compare_lines(guess, answer)
     
     # 年份比较
     opening_year_guess = guess_info.get('opening_year', 0)
@@ -627,14 +1167,15 @@ def submit_guess():
         'district_match': guess_info.get('district') == answer_info.get('district'),
         'district_guess': guess_info.get('district', ''),
         'district_answer': answer_info.get('district', ''),
-        'lines_guess': list(guess_lines),
-        'lines_answer': list(answer_lines),
+        'lines_guess': guess_info.get('lines', []),
+        'lines_answer': answer_info.get('lines', []),
         'lines_match': lines_match,
         'opening_year_guess': opening_year_guess,
         'opening_year_answer': opening_year_answer,
         'year_relation': year_relation,
         'min_stations': min_stations,
         'min_transfers': min_transfers,
+        'route_options': route_options,
         'is_correct': guess == answer
     }
     
@@ -713,7 +1254,7 @@ def submit_guess_guo_jing():
         return jsonify({'error': '数据错误'})
 
     # 在 nation_lookup 中查找猜测的国家信息 (现在查找的是输入的原始字符串)
-    lookup_result = nation_lookup.get(guess_input.lower())
+    lookup_result = nation_lookup.get(guess_input)
     if not lookup_result:
         return jsonify({'error': f'猜测的国家不存在: {guess_input}'})
 
@@ -721,10 +1262,14 @@ def submit_guess_guo_jing():
     guess_nation_zh_name = lookup_result['zh_name']
     guess_coords = lookup_result['coords']
 
-    # 计算距离和方向
-    distance = dist(guess_coords, answer_coords)
-    bearing_angle_raw = bearing(guess_coords, answer_coords) # 获取度数值
-    latlongbrng_raw = latlongbrng(guess_coords, answer_coords)
+    # 计算距离和方向：有预计算的距离矩阵时直接查表（旧会话没有 problem_index 时现算）
+    problem_index = session.get('problem_index')
+    if geo is not None and problem_index is not None:
+        distance, bearing_angle_raw, latlongbrng_raw = guess_matrix.lookup(problem_index, lookup_result['index'])
+    else:
+        distance = dist(guess_coords, answer_coords)
+        bearing_angle_raw = bearing(guess_coords, answer_coords) # 获取度数值
+        latlongbrng_raw = latlongbrng(guess_coords, answer_coords)
 
     # 确保 bearing_angle 是数值类型
     try:
@@ -814,15 +1359,14 @@ def fill_guo_select_nation():
     row = data.get('row')
     col = data.get('col')
     nation_name_input = data.get('nation') # 用户输入的名称（可能是英文、中文、简称等）
-    lookup_result = nation_lookup.get(nation_name_input.lower())
-    nation_name_zh = lookup_result['zh_name'] # 获取中文全称
     if row is None or col is None or not nation_name_input:
         return jsonify({'error': '数据错误'})
 
     # --- 修改：通过 nation_lookup 获取中文全称 ---
-    
+    lookup_result = nation_lookup.get(nation_name_input)
     if not lookup_result:
         return jsonify({'error': f'选择的国家不存在: {nation_name_input}'})
+    nation_name_zh = lookup_result['zh_name'] # 获取中文全称
 
     # 获取当前网格
     grid = session.get('fill_guo_grid', [[None for _ in range(3)] for _ in range(3)])
@@ -1011,12 +1555,97 @@ def get_station_info(station_name):
         return jsonify({'success': True, 'info': info})
     return jsonify({'success': False, 'error': '站点不存在'})
 
+@app.route('/metro_candidates')
+def metro_candidates():
+    """猜铁提示API：与本局已有猜测结果都一致的候选站"""
+    if session.get('game_type') != 'metro_guess':
+        return jsonify({'success': False, 'error': '当前不在猜铁游戏中'})
+    candidates = metro_graph.remaining_candidates(session.get('guesses', []))
+    return jsonify({'success': True, 'count': len(candidates), 'candidates': candidates})
+
+@app.route('/guo_jing_hint')
+def guo_jing_hint():
+    """国景提示API：首都离照片位置不超过 radius 千米（默认 1500）的国家；范围内一个都没有时给出最近的 3 个
+
+    只按国名排序给出名单、不给距离，否则离得最近的那个往往就是答案。
+    """
+    if session.get('game_type') != 'guo_jing' or session.get('game_over'):
+        return jsonify({'success': False, 'error': '当前不在国景游戏中'})
+    if geo is None:
+        return jsonify({'success': False, 'error': '提示不可用'})
+    radius = min(max(request.args.get('radius', 1500, type=int), 100), 5000)
+    coords = session.get('answer_coords')
+    nations = nations_within(coords, radius) or nearest_nations(coords, 3)
+    return jsonify({'success': True, 'radius': radius, 'nations': sorted(name for name, _ in nations)})
+
+@app.route('/nation_suggest')
+def nation_suggest():
+    """国家名称补全API：以 q 开头的英文 / 中文 / 日文名称，每个国家只出现一次"""
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    matches = nation_lookup.complete(request.args.get('q', ''), limit)
+    return jsonify({'success': True, 'names': [name for name, _ in matches]})
+
+@app.route('/metro_route')
+def metro_route():
+    """猜铁结束后展示路线API：从猜测的站（默认最后一次猜测）到答案站的最少站数路线"""
+    answer = session.get('answer')
+    if session.get('game_type') != 'metro_guess' or not session.get('game_over') or not answer:
+        return jsonify({'success': False, 'error': '游戏尚未结束'})
+    guesses = session.get('guesses', [])
+    start = request.args.get('from') or (guesses[-1]['guess'] if guesses else None)
+    route = metro_graph.find_route(start, answer) if start else None
+    if route is None:
+        return jsonify({'success': False, 'error': '无法还原路线'})
+    return jsonify({'success': True, 'from': start, 'to': answer, 'route': route})
+
 @app.route('/leaderboard')
 def show_leaderboard():
-    """显示排行榜"""
+    """显示排行榜（?class=班级 时只显示该班级）"""
     page = int(request.args.get('page', 1))
-    scores, total_pages = leaderboard.get_paginated_scores(page, per_page=10)
-    return render_template('leaderboard.html', scores=scores, page=page, total_pages=total_pages)
+    class_name = request.args.get('class') or None
+    scores, total_pages = leaderboard.get_paginated_scores(page, per_page=10, class_name=class_name)
+    class_summary = leaderboard.get_class_summary(class_name) if class_name else None
+    return render_template('leaderboard.html', scores=scores, page=page, total_pages=total_pages,
+                           class_name=class_name, class_args={'class': class_name} if class_name else {},
+                           class_names=leaderboard.get_class_names(), class_summary=class_summary)
+
+def score_to_json(entry):
+    """把一条成绩记录转成 JSON 友好的字典"""
+    passed_modules, avg_attempts = leaderboard.calculate_score(entry)
+    return {
+        'timestamp': entry.timestamp_text,
+        'class': entry.class_name,
+        'name': entry.name,
+        'passed': passed_modules,
+        'avg_attempts': round(avg_attempts, 2),
+        'modules': {module: {'success': entry.success_of(module), 'attempts': entry.attempts_of(module)}
+                    for module in MODULES},
+    }
+
+@app.route('/leaderboard_data')
+def leaderboard_data():
+    """排行榜JSON接口：?class=班级 返回该班汇总和排名分页，否则返回各班汇总和前 top 名"""
+    class_name = request.args.get('class') or None
+    if class_name:
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 10, type=int), 1), 100)
+        scores, total_pages = leaderboard.get_paginated_scores(page, per_page=per_page, class_name=class_name)
+        return jsonify({
+            'success': True,
+            'summary': leaderboard.get_class_summary(class_name),
+            'scores': [score_to_json(entry) for entry in scores],
+            'page': page,
+            'total_pages': total_pages,
+        })
+    top = min(max(request.args.get('top', 3, type=int), 1), 50)
+    top_per_class = leaderboard.get_top_per_class(top)
+    return jsonify({
+        'success': True,
+        'classes': [{
+            'summary': leaderboard.get_class_summary(name),
+            'top': [score_to_json(entry) for entry in entries],
+        } for name, entries in top_per_class.items()],
+    })
 
 if __name__ == '__main__':
     app.run(host="0.0.0.0", port=5000, debug=False)
\ No newline at end of file
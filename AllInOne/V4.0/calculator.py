@@ -33,3 +33,49 @@ def dist(latlong1, latlong2):
     distance = R * angle
     if distance > 100: return round(distance / 100) * 100
     return round(distance / 10) * 10
+
+# 批量版本：参数可以是单个 [lat, lon] 或 [[lat, lon], ...]。
+# dists / bearings / latlongbrngs 逐对计算，单个点会广播到另一边的每个点（一对多、多对一）；
+# *_matrix 计算两组点的所有组合（多对多），返回 len(latlongs1) 行、len(latlongs2) 列。
+# 每个点先用 geo.point_table 预计算一次，再用 geo 中与国景相同的公式计算；
+# geo 在第一次调用批量函数时才导入，单点的 dist / bearing / latlongbrng 不依赖 geo.py。
+def _as_points(latlongs):
+    # 单个点是两个数；N×2 的列表、元组或数组（包括 N 为 0 或 2）按点列表处理
+    if len(latlongs) == 2 and not hasattr(latlongs[0], '__len__'): return [latlongs]
+    return list(latlongs)
+
+def _broadcast(values1, values2):
+    if len(values1) == 1: return values1 * len(values2), values2
+    if len(values2) == 1: return values1, values2 * len(values1)
+    if len(values1) != len(values2): raise ValueError("point lists must have the same length or a single point")
+    return values1, values2
+
+def _pairwise(function, latlongs1, latlongs2):
+    import geo
+    points1, points2 = _broadcast(geo.point_table(_as_points(latlongs1)), geo.point_table(_as_points(latlongs2)))
+    function = getattr(geo, function)
+    return [function(p, q) for p, q in zip(points1, points2)]
+
+def _matrix(function, latlongs1, latlongs2):
+    import geo
+    points2 = geo.point_table(_as_points(latlongs2))
+    function = getattr(geo, function)
+    return [[function(p, q) for q in points2] for p in geo.point_table(_as_points(latlongs1))]
+
+def dists(latlongs1, latlongs2):
+    return _pairwise('dist', latlongs1, latlongs2)
+
+def dist_matrix(latlongs1, latlongs2):
+    return _matrix('dist', latlongs1, latlongs2)
+
+def bearings(latlongs1, latlongs2):
+    return _pairwise('bearing', latlongs1, latlongs2)
+
+def bearing_matrix(latlongs1, latlongs2):
+    return _matrix('bearing', latlongs1, latlongs2)
+
+def latlongbrngs(latlongs1, latlongs2):
+    return _pairwise('latlongbrng', latlongs1, latlongs2)
+
+def latlongbrng_matrix(latlongs1, latlongs2):
+    return _matrix('latlongbrng', latlongs1, latlongs2)
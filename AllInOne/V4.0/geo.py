@@ -0,0 +1,204 @@
+# geo.py
+# 首都 / 题目坐标的预计算：每个点的单位向量以及纬度、经度的正余弦只在建表时算一次，
+# 之后求距离和方位角只需几次乘法和一次 atan2，不再每次调用都做六次三角函数。
+#
+# 圆心角用 atan2(|p×q|, p·q) 计算：近距离时不会像 acos(1 - 弦长²/2) 那样因为抵消而丢精度，
+# 对跖点附近也同样稳定。
+#
+# 国家和题目都是固定的，GuessMatrix 在启动时一次算出所有 (题目, 国家) 组合的距离和方向，
+# 国景每次猜测只需查表。
+#
+# BallTree 是单位向量上的球树，用于"离某点最近的 k 个首都"和"某点若干千米内的首都"这类查询，
+# 只访问可能包含结果的节点；换成城市等更大的数据集时同样适用。
+import heapq
+import math
+from array import array
+
+R = 6371
+
+class GeoPoint:
+    """球面上的一个点：经纬度（度）、纬度和经度的正余弦、单位向量 (x, y, z)"""
+    __slots__ = ('lat', 'lon', 'sin_lat', 'cos_lat', 'sin_lon', 'cos_lon', 'x', 'y', 'z')
+
+    def __init__(self, latlong):
+        self.lat, self.lon = latlong[0], latlong[1]
+        lat, lon = math.radians(self.lat), math.radians(self.lon)
+        self.sin_lat, self.cos_lat = math.sin(lat), math.cos(lat)
+        self.sin_lon, self.cos_lon = math.sin(lon), math.cos(lon)
+        self.x = self.cos_lat * self.cos_lon
+        self.y = self.cos_lat * self.sin_lon
+        self.z = self.sin_lat
+
+def point_table(coords_list):
+    """把 [lat, lon] 列表预计算成 GeoPoint 列表，下标与原列表一致"""
+    return [GeoPoint(coords) for coords in coords_list]
+
+def central_angle(p, q):
+    """两点之间的圆心角（弧度）"""
+    cx = p.y * q.z - p.z * q.y
+    cy = p.z * q.x - p.x * q.z
+    cz = p.x * q.y - p.y * q.x
+    return math.atan2(math.sqrt(cx * cx + cy * cy + cz * cz), p.x * q.x + p.y * q.y + p.z * q.z)
+
+def distance(p, q):
+    """两点之间的大圆距离（千米，未取整）"""
+    return R * central_angle(p, q)
+
+def round_distance(distance):
+    """与 calculator.dist 相同的取整：超过 100 千米取整到百位，否则取整到十位"""
+    if distance > 100: return round(distance / 100) * 100
+    return round(distance / 10) * 10
+
+def dist(p, q):
+    """取整后的距离，与 calculator.dist 对应"""
+    return round_distance(distance(p, q))
+
+def bearing(p, q):
+    """从 p 到 q 的大圆初始方位角（度，0~360，正北为 0），与 calculator.bearing 对应
+
+    经度差的正余弦由两点经度的正余弦按和差公式得到，不再调用三角函数。
+    """
+    sin_dlon = q.sin_lon * p.cos_lon - q.cos_lon * p.sin_lon
+    cos_dlon = q.cos_lon * p.cos_lon + q.sin_lon * p.sin_lon
+    y = sin_dlon * q.cos_lat
+    x = p.cos_lat * q.sin_lat - p.sin_lat * q.cos_lat * cos_dlon
+    return (math.degrees(math.atan2(y, x)) + 360) % 360
+
+def latlongbrng(p, q):
+    """把经纬度当作平面坐标时从 p 到 q 的方向角（度），经度差取绝对值最小的一种，与 calculator.latlongbrng 对应"""
+    x = q.lat - p.lat
+    y = min(q.lon - p.lon, q.lon - p.lon + 360, q.lon - p.lon - 360, key=abs)
+    return (math.degrees(math.atan2(y, x)) + 360) % 360
+
+def distances_from(p, points):
+    """p 到 points 中每个点的大圆距离（千米，未取整）"""
+    return [R * central_angle(p, q) for q in points]
+
+class GuessMatrix:
+    """所有 (题目, 国家) 组合从国家首都到题目位置的 取整距离 / 大圆方位角 / 平面方向角
+
+    第 j 个题目、第 i 个国家存放在下标 j * 国家数 + i，同一题目的所有国家在一段连续内存中。
+    """
+    __slots__ = ('columns', 'distances', 'bearings', 'latlong_bearings')
+
+    def __init__(self, nation_points, problem_points):
+        self.columns = len(nation_points)
+        self.distances = array('H')
+        self.bearings = array('d')
+        self.latlong_bearings = array('d')
+        for q in problem_points:
+            for p in nation_points:
+                self.distances.append(dist(p, q))
+                self.bearings.append(bearing(p, q))
+                self.latlong_bearings.append(latlongbrng(p, q))
+
+    def lookup(self, problem_index, nation_index):
+        """返回 (取整距离, 大圆方位角, 平面方向角)"""
+        k = problem_index * self.columns + nation_index
+        return self.distances[k], self.bearings[k], self.latlong_bearings[k]
+
+    def answer_rank(self, problem_index, nation_index):
+        """离题目位置比答案国家首都更近的首都个数（0 表示答案首都就是最近的），用于离线分析题目难度"""
+        row = self.distances[problem_index * self.columns:(problem_index + 1) * self.columns]
+        return sum(1 for distance in row if distance < row[nation_index])
+
+def chord(angle):
+    """圆心角（弧度）对应的单位球弦长，弦长随圆心角单调递增，可以直接用来比较远近"""
+    return 2 * math.sin(min(angle, math.pi) / 2)
+
+class BallTree:
+    """点集（GeoPoint 列表）上的球树，按单位向量之间的弦长划分
+
+    每个节点记录一个球心（子树点的单位向量均值）和能包住子树所有点的半径；
+    查询点到球心的弦长减去半径就是它到子树中任意一点的距离下界，下界已经超出时整棵子树跳过。
+    查询结果给出点在原列表中的下标，距离用 distance 计算（千米，未取整）。
+    """
+    __slots__ = ('points', 'order', 'centers', 'radii', 'bounds', 'children')
+
+    def __init__(self, points, leaf_size=8):
+        self.points = points
+        self.order = list(range(len(points)))  # 叶子节点的点是 order 中连续的一段
+        self.centers = []   # 节点球心 (x, y, z)
+        self.radii = []     # 节点半径（弦长）
+        self.bounds = []    # 节点在 order 中的区间 (start, end)
+        self.children = []  # 子节点下标 (left, right)，叶子节点为 None
+        if points:
+            self._build(0, len(points), leaf_size)
+
+    def _build(self, start, end, leaf_size):
+        node = len(self.centers)
+        members = [self.points[i] for i in self.order[start:end]]
+        center = (sum(p.x for p in members) / len(members),
+                  sum(p.y for p in members) / len(members),
+                  sum(p.z for p in members) / len(members))
+        self.centers.append(center)
+        self.radii.append(max(_chord_to(center, p) for p in members))
+        self.bounds.append((start, end))
+        self.children.append(None)
+        if end - start <= leaf_size:
+            return node
+
+        # 沿跨度最大的坐标轴在中位数处一分为二
+        spreads = [max(values) - min(values) for values in
+                   ([p.x for p in members], [p.y for p in members], [p.z for p in members])]
+        axis = ('x', 'y', 'z')[spreads.index(max(spreads))]
+        self.order[start:end] = sorted(self.order[start:end], key=lambda i: getattr(self.points[i], axis))
+        middle = (start + end) // 2
+        left = self._build(start, middle, leaf_size)
+        right = self._build(middle, end, leaf_size)
+        self.children[node] = (left, right)
+        return node
+
+    def _lower_bound(self, q, node):
+        return max(0.0, _chord_to(self.centers[node], q) - self.radii[node])
+
+    def nearest(self, q, k=1):
+        """离 q 最近的 k 个点，按距离从近到远返回 [(下标, 距离千米), ...]"""
+        if not self.points or k <= 0:
+            return []
+        best = []  # 大顶堆 (-弦长, 下标)，保存目前最近的 k 个点
+        queue = [(self._lower_bound(q, 0), 0)]  # 按距离下界从小到大访问节点
+        while queue:
+            bound, node = heapq.heappop(queue)
+            if len(best) == k and bound > -best[0][0]:
+                break
+            if self.children[node] is None:
+                start, end = self.bounds[node]
+                for i in self.order[start:end]:
+                    length = _chord_between(self.points[i], q)
+                    if len(best) < k:
+                        heapq.heappush(best, (-length, i))
+                    elif length < -best[0][0]:
+                        heapq.heapreplace(best, (-length, i))
+            else:
+                for child in self.children[node]:
+                    heapq.heappush(queue, (self._lower_bound(q, child), child))
+        return sorted(((i, distance(self.points[i], q)) for _, i in best), key=lambda item: (item[1], item[0]))
+
+    def within(self, q, radius):
+        """离 q 不超过 radius 千米的所有点，按距离从近到远返回 [(下标, 距离千米), ...]"""
+        if not self.points or radius < 0:
+            return []
+        limit = chord(radius / R) + 1e-12  # 剪枝时留一点余量，最终是否入选按 distance 判断
+        result = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if self._lower_bound(q, node) > limit:
+                continue
+            if self.children[node] is None:
+                start, end = self.bounds[node]
+                for i in self.order[start:end]:
+                    d = distance(self.points[i], q)
+                    if d <= radius:
+                        result.append((i, d))
+            else:
+                stack.extend(self.children[node])
+        result.sort(key=lambda item: (item[1], item[0]))
+        return result
+
+def _chord_to(center, p):
+    return math.sqrt((center[0] - p.x) ** 2 + (center[1] - p.y) ** 2 + (center[2] - p.z) ** 2)
+
+def _chord_between(p, q):
+    return math.sqrt((p.x - q.x) ** 2 + (p.y - q.y) ** 2 + (p.z - q.z) ** 2)
@@ -0,0 +1,95 @@
+# metro_bundle.py
+# 把 StationInfo.csv / ShortestRoute.csv / MinimumChange.csv 等源数据预编译成一个二进制数据包，
+# 启动时直接 mmap 读取，不再逐格 csv 解析 + int()。
+#
+# 文件格式（所有整数按本机字节序）：
+#   头部 HEADER: 魔数, 格式版本, 字节序标记, 源CSV的sha256, 0（保留）, 元数据长度
+#   元数据: UTF-8 JSON {"station_names": [...], "stations": {...}, ..., "arrays": [[名称, 类型码, 长度], ...]}
+#   之后按 arrays 的顺序依次存放各个整数数组，每个数组的起点对齐到 8 字节
+#   （最短站数矩阵、最少换乘矩阵、下一站矩阵、Pareto 前沿表等，矩阵均按行展开）
+import hashlib, json, mmap, os, struct, sys, tempfile
+from array import array
+
+MAGIC = b'XCMETRO\0'
+VERSION = 3
+HEADER = struct.Struct('=8sHH32sII')
+BYTEORDER = 1 if sys.byteorder == 'little' else 2
+
+def source_hash(paths):
+    """计算源CSV文件内容（连同格式版本）的 sha256，任一文件变化（包括新增或删除）都会导致数据包失效"""
+    digest = hashlib.sha256(struct.pack('=H', VERSION))
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = None
+        digest.update(struct.pack('=q', -1 if data is None else len(data)))
+        digest.update(data or b'')
+    return digest.digest()
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+def write_bundle(path, digest, meta, arrays):
+    """写出数据包（先写临时文件再替换，已经 mmap 旧文件的进程不受影响）
+
+    meta 为可 JSON 序列化的字典，arrays 为 [(名称, array), ...]。
+    """
+    arrays = [(name, values if isinstance(values, array) else array(values.format, values)) for name, values in arrays]
+    meta = dict(meta, arrays=[[name, values.typecode, len(values)] for name, values in arrays])
+    meta = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+
+    # 临时文件名各不相同：多个进程同时冷启动时各写各的完整文件，os.replace 原子地换上其中一个
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                    dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, BYTEORDER, digest, 0, len(meta)))
+            f.write(meta)
+            for _, values in arrays:
+                f.write(b'\0' * (_align(f.tell()) - f.tell()))
+                f.write(values.tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def load_bundle(path, digest):
+    """mmap 读取数据包；文件不存在、格式不对或与源CSV的哈希不一致时返回 None
+
+    返回元数据字典，其中各数组是直接指向 mmap 的 memoryview，下标方式与 array 相同。
+    """
+    try:
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):  # 文件不存在或为空
+        return None
+
+    if len(mm) < HEADER.size:
+        mm.close()
+        return None
+    magic, version, byteorder, bundle_digest, _, meta_len = HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or version != VERSION or byteorder != BYTEORDER or bundle_digest != digest:
+        mm.close()
+        return None
+
+    offset = HEADER.size + meta_len
+    if len(mm) < offset:
+        mm.close()
+        return None
+    bundle = json.loads(mm[HEADER.size:offset].decode('utf-8'))
+    spans = []
+    for name, typecode, length in bundle.pop('arrays'):
+        start = _align(offset)
+        offset = start + array(typecode).itemsize * length
+        spans.append((name, typecode, start, offset))
+    if len(mm) < offset:
+        mm.close()
+        return None
+
+    view = memoryview(mm)
+    for name, typecode, start, end in spans:
+        bundle[name] = view[start:end].cast(typecode)
+    bundle['mmap'] = mm
+    return bundle
@@ -0,0 +1,101 @@
+# metro_solver.py
+# 猜铁的最优猜测求解器：按反馈 (区县, 线路匹配, 年份关系, 最少站数, 最少换乘) 给候选答案分组，
+# 每一步选让分组熵最大的猜测。用来统计完美玩家猜出每个答案需要几次，
+# 并在地图数据改动后检查所有答案是否都能在 6 次内猜出。
+#
+# 用法（在 AllInOne/V4.0 目录下运行，与 app.py 读取同一份 data/；只加载地铁图，不导入 Flask 应用）：
+#   python metro_solver.py [--max-guesses 6]
+# 有答案超过 max-guesses 次才能猜出时退出码为 1。
+import argparse, math, sys, time
+from collections import Counter, defaultdict
+
+class MetroSolver:
+    """在 ShanghaiMetroGraph 上求解猜铁：先缓存所有 (猜测, 答案) 站对的反馈编码，再按熵贪心地选猜测"""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.stations = graph.get_all_stations()
+        self.position = {name: i for i, name in enumerate(self.stations)}
+        index = [graph.station_index[name] for name in self.stations]
+        # codes[g][a]：猜第 g 个站、答案为第 a 个站时的反馈编码（下标按 self.stations）
+        self.codes = []
+        for name in self.stations:
+            row = graph.feedback_codes(name)
+            self.codes.append([row[j] for j in index])
+        self.choices = {}  # 候选集合 -> 选定的猜测，同一个候选集合只计算一次
+
+    def partition(self, guess, candidates):
+        """按猜 guess 时的反馈编码给候选答案分组"""
+        groups = defaultdict(list)
+        row = self.codes[guess]
+        for answer in candidates:
+            groups[row[answer]].append(answer)
+        return groups
+
+    def best_guess(self, candidates):
+        """分组熵最大的猜测；熵相同时优先猜候选答案本身（可能直接猜中），再按站名顺序"""
+        if len(candidates) <= 2:
+            return candidates[0]
+        key = tuple(candidates)
+        if key in self.choices:
+            return self.choices[key]
+
+        members = set(candidates)
+        total = len(candidates)
+        best, best_score = None, None
+        for guess, row in enumerate(self.codes):
+            counts = Counter(row[answer] for answer in candidates)
+            entropy = -sum(count / total * math.log2(count / total) for count in counts.values())
+            score = (entropy, guess in members)
+            if best_score is None or score > best_score:
+                best, best_score = guess, score
+        self.choices[key] = best
+        return best
+
+    def solve(self, answer):
+        """按最优策略猜 answer，返回依次猜的站名"""
+        target = self.position[answer]
+        candidates = list(range(len(self.stations)))
+        guesses = []
+        while True:
+            guess = self.best_guess(candidates)
+            guesses.append(self.stations[guess])
+            if guess == target:
+                return guesses
+            code = self.codes[guess][target]
+            candidates = [answer for answer in candidates if self.codes[guess][answer] == code]
+
+    def solve_all(self):
+        """所有答案需要的猜测次数：{站名: 次数}"""
+        return {answer: len(self.solve(answer)) for answer in self.stations}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="猜铁最优猜测求解与基准测试")
+    parser.add_argument('--max-guesses', type=int, default=6, help="允许的最多猜测次数（默认 6）")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    from shanghai_metro import ShanghaiMetroGraph
+    graph = ShanghaiMetroGraph()
+    loaded = time.perf_counter()
+    solver = MetroSolver(graph)
+    coded = time.perf_counter()
+    counts = solver.solve_all()
+    solved = time.perf_counter()
+
+    distribution = Counter(counts.values())
+    print(f"answers: {len(counts)}")
+    for guesses in sorted(distribution):
+        print(f"  {guesses} guesses: {distribution[guesses]}")
+    print(f"mean: {sum(counts.values()) / len(counts):.3f}, worst: {max(counts.values())}")
+    print(f"first guess: {solver.solve(solver.stations[0])[0]}")
+    print(f"time: load {loaded - started:.3f}s, feedback codes {coded - loaded:.3f}s, solve {solved - coded:.3f}s")
+
+    unsolvable = sorted(answer for answer, guesses in counts.items() if guesses > args.max_guesses)
+    if unsolvable:
+        print(f"{len(unsolvable)} answers need more than {args.max_guesses} guesses: {', '.join(unsolvable)}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
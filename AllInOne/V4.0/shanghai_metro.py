@@ -0,0 +1,888 @@
+# shanghai_metro.py
+# 猜铁使用的上海地铁图：站点信息、最少站数 / 最少换乘矩阵、路线还原、增量修改、批量反馈编码和按难度出题。
+# 不依赖 Flask，app.py 和 metro_solver.py 都从这里创建 ShanghaiMetroGraph；数据路径相对于 AllInOne/V4.0 目录。
+import random, csv, threading, json, heapq
+from collections import defaultdict, Counter
+from functools import lru_cache
+from array import array
+from typing import List, Dict
+
+try:
+    import metro_bundle
+except ImportError:
+    print("Warning: metro_bundle.py not found. Metro data will be parsed from CSV.")
+    metro_bundle = None
+
+class AliasTable:
+    """Walker 别名表：按权重 O(1) 抽样，建表 O(n)"""
+    __slots__ = ('items', 'probability', 'alias')
+
+    def __init__(self, items, weights):
+        n = len(items)
+        total = sum(weights)
+        if not n or total <= 0:
+            raise ValueError("alias table needs at least one positive weight")
+        self.items = list(items)
+        self.probability = [1.0] * n
+        self.alias = list(range(n))
+        scaled = [weight * n / total for weight in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            i, j = small.pop(), large.pop()
+            self.probability[i] = scaled[i]
+            self.alias[i] = j
+            scaled[j] -= 1 - scaled[i]
+            (small if scaled[j] < 1 else large).append(j)
+        # 剩下的格子只差浮点误差，概率按 1 处理
+
+    def sample(self, rng=random):
+        i = rng.randrange(len(self.items))
+        return self.items[i] if rng.random() < self.probability[i] else self.items[self.alias[i]]
+
+# --- 上海地铁图类 ---
+class ShanghaiMetroGraph:
+    """上海地铁网络图"""
+    # 查不到站点时返回的站数和换乘次数
+    NO_ROUTE_STATIONS = 100
+    NO_ROUTE_TRANSFERS = 10
+    # 下一站矩阵中不可达时的值
+    NO_NEXT_HOP = 65535
+    # 预编译数据包及其源CSV，CSV 有变化（哈希不一致）时回退到解析CSV并重新生成数据包
+    DATA_FILES = ['data/StationInfo.csv', 'data/ShortestRoute.csv', 'data/MinimumChange.csv',
+                  'data/NextHop.csv', 'data/SectionLines.csv', 'data/ParetoRoutes.csv']
+    BUNDLE_FILE = 'data/metro.bundle'
+    # 新开站点/线路的增量修改记录（每行一个 JSON），启动时在基础数据之上重放
+    EDITS_FILE = 'data/metro_edits.jsonl'
+    # 最多缓存多少个答案站的距离向量
+    VECTOR_CACHE_SIZE = 64
+    # 猜测反馈中线路匹配和年份关系的取值，编码时用下标
+    LINES_MATCH = ('none', 'partial', 'perfect')
+    YEAR_RELATION = ('earlier', 'same', 'later')
+    # 按难度排名三等分的难度等级，以及各出题模式下三个等级的抽样权重
+    DIFFICULTY_LEVELS = ('easy', 'normal', 'hard')
+    LEVEL_WEIGHTS = {
+        'easy': (6, 3, 1),
+        'hard': (1, 3, 6),
+    }
+    
+    def __init__(self, low_memory=False):
+        # 初始化数据结构
+        self.stations = {}  # 站点信息
+        self.lines = {}     # 线路信息
+        self.line_bits = {}      # 线路 -> 位序号
+        self.station_masks = {}  # 站点 -> 所在线路的位集，比较线路只需几次整数运算
+        self.graph = defaultdict(list)  # 邻接表表示的地铁网络
+        self.station_lines = defaultdict(set)  # 站点对应的线路
+        self.station_nodes = {}  # 站点节点映射（支持同站不同线）
+        
+        # 用于存储预计算的最短距离和换乘次数：站名 -> 下标，两个 n*n 的紧凑整数矩阵（按行展开）
+        self.station_names = []
+        self.station_index = {}
+        self.shortest_routes = array('H')
+        self.minimum_changes = array('B')
+        # 最少站数路线的下一站：第 j 行第 i 列是从 i 去 j 的下一站下标，用于还原路线
+        self.next_hops = array('H')
+        self.sections = {}  # (站名1, 站名2)（按站名排序）-> 这一区间所属的线路列表
+        # 各站对所有非劣的 (站数, 换乘次数)，按 CSR 存放：第 k 个站对的前沿是 [pareto_offsets[k], pareto_offsets[k+1]) 区间
+        self.pareto_offsets = array('I')
+        self.pareto_stations = array('H')
+        self.pareto_transfers = array('B')
+        self.bundle = None  # mmap 的数据包，矩阵直接指向其中的内存
+        # 到某个站的最少站数 / 最少换乘向量，按站名做 LRU 缓存（一局猜铁的答案不变，每次猜测只需按下标取值）
+        self.route_vectors = lru_cache(maxsize=self.VECTOR_CACHE_SIZE)(self._route_vectors)
+        self.features = None  # 按站点下标排列的 (线路位集, 区县编号, 开通年份)，批量计算猜测反馈时使用
+        # 以下均在第一次使用时计算，增量修改后清空
+        self.sorted_stations = None  # 按站名排序的站点列表
+        self.difficulty = None       # 站点 -> 难度
+        self.samplers = {}           # 出题模式 -> 按难度等级加权的别名表
+        self.difficulty_lock = threading.Lock()
+        
+        # 初始化数据
+        # low_memory: 没有数据包时不把 n*n 矩阵读进内存，需要时从CSV中只读出答案站那一行
+        if not self.load_bundle():
+            self.load_stations()
+            self.load_sections()
+            if low_memory:
+                self.load_station_index()
+            else:
+                self.load_distances_and_changes()
+                self.load_pareto()
+                self.save_bundle()
+        self.load_edits()
+
+    def load_bundle(self) -> bool:
+        """从预编译数据包加载全部数据，成功返回 True"""
+        if metro_bundle is None:
+            return False
+        try:
+            bundle = metro_bundle.load_bundle(self.BUNDLE_FILE, metro_bundle.source_hash(self.DATA_FILES))
+        except Exception as e:
+            print(f"Error loading metro bundle: {e}")
+            return False
+        if bundle is None:
+            return False
+        self.bundle = bundle
+        self.stations = bundle['stations']
+        self.lines = bundle['lines']
+        for name, info in self.stations.items():
+            self._add_line_bits(name, info['lines'])
+        self.station_names = bundle['station_names']
+        self.station_index = {name: i for i, name in enumerate(self.station_names)}
+        self.shortest_routes = bundle['shortest_routes']
+        self.minimum_changes = bundle['minimum_changes']
+        self.next_hops = bundle['next_hops']
+        self.pareto_offsets = bundle['pareto_offsets']
+        self.pareto_stations = bundle['pareto_stations']
+        self.pareto_transfers = bundle['pareto_transfers']
+        for a, b, line in bundle['sections']:
+            self._add_section(a, b, line)
+        return True
+
+    def save_bundle(self):
+        """把从CSV解析出的数据写成数据包，供之后启动的进程直接加载"""
+        if metro_bundle is None or not self.shortest_routes or not self.minimum_changes:
+            return
+        try:
+            meta = {
+                'station_names': self.station_names,
+                'stations': self.stations,
+                'lines': self.lines,
+                'sections': [[a, b, line] for (a, b), lines in self.sections.items() for line in lines],
+            }
+            metro_bundle.write_bundle(self.BUNDLE_FILE, metro_bundle.source_hash(self.DATA_FILES), meta, [
+                (attr, getattr(self, attr)) for attr in ('shortest_routes', 'minimum_changes', 'next_hops',
+                                                         'pareto_offsets', 'pareto_stations', 'pareto_transfers')
+            ])
+        except Exception as e:
+            print(f"Error writing metro bundle: {e}")
+
+    def load_distances_and_changes(self):
+        """加载预计算的最短距离和最少换乘次数"""
+        # 加载最短站数
+        try:
+            self.shortest_routes = self._load_matrix('data/ShortestRoute.csv', 'H', self.NO_ROUTE_STATIONS)
+        except FileNotFoundError:
+            print("Warning: data/ShortestRoute.csv not found. Calculating distances will fail.")
+        except Exception as e:
+            print(f"Error loading shortest routes: {e}")
+
+        # 加载最少换乘次数
+        try:
+            self.minimum_changes = self._load_matrix('data/MinimumChange.csv', 'B', self.NO_ROUTE_TRANSFERS)
+        except FileNotFoundError:
+            print("Warning: data/MinimumChange.csv not found. Calculating transfers will fail.")
+        except Exception as e:
+            print(f"Error loading minimum changes: {e}")
+
+        # 加载最少站数路线的下一站（缺失时只是无法还原路线）
+        try:
+            self.next_hops = self._load_matrix('data/NextHop.csv', 'H', self.NO_NEXT_HOP, indices=True)
+        except FileNotFoundError:
+            print("Warning: data/NextHop.csv not found. Route reconstruction will fail.")
+        except Exception as e:
+            print(f"Error loading next hops: {e}")
+        if len(self.next_hops) != len(self.station_names) ** 2:
+            self.next_hops = array('H', [self.NO_NEXT_HOP]) * len(self.station_names) ** 2
+
+    def load_pareto(self):
+        """加载 Pareto 前沿表 ParetoRoutes.csv（格式同距离矩阵，每格为空格分隔的 站数/换乘次数）"""
+        n = len(self.station_names)
+        cells = [''] * (n * n)
+        try:
+            with open('data/ParetoRoutes.csv', 'r', encoding='utf-8') as f:
+                reader = csv.reader(f)
+                columns = [self.station_index.get(name) for name in next(reader)[1:]]
+                for row in reader:
+                    i = self.station_index.get(row[0])
+                    if i is None:
+                        continue
+                    for j, cell in zip(columns, row[1:]):
+                        if j is not None:
+                            cells[i * n + j] = cell
+        except FileNotFoundError:
+            print("Warning: data/ParetoRoutes.csv not found. Route options will be computed on demand.")
+            return
+        except Exception as e:
+            print(f"Error loading pareto routes: {e}")
+            return
+        offsets = array('I', [0])
+        for cell in cells:
+            for item in cell.split():
+                stations, transfers = item.split('/')
+                self.pareto_stations.append(int(stations))
+                self.pareto_transfers.append(int(transfers))
+            offsets.append(len(self.pareto_stations))
+        self.pareto_offsets = offsets
+
+    def load_sections(self):
+        """加载每个相邻区间所属的线路"""
+        try:
+            with open('data/SectionLines.csv', 'r', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    self._add_section(row['站名1'], row['站名2'], row['线路'])
+        except FileNotFoundError:
+            print("Warning: data/SectionLines.csv not found. Route lines will be unknown.")
+        except Exception as e:
+            print(f"Error loading section lines: {e}")
+
+    def _add_section(self, station_a, station_b, line):
+        key = (station_a, station_b) if station_a < station_b else (station_b, station_a)
+        lines = self.sections.setdefault(key, [])
+        if line not in lines:
+            lines.append(line)
+
+    def load_station_index(self):
+        """只读取矩阵CSV的表头，建立站名 -> 下标的映射"""
+        try:
+            with open('data/ShortestRoute.csv', 'r', encoding='utf-8') as f:
+                self.station_names = next(csv.reader(f))[1:]
+            self.station_index = {name: i for i, name in enumerate(self.station_names)}
+        except FileNotFoundError:
+            print("Warning: data/ShortestRoute.csv not found. Calculating distances will fail.")
+        except Exception as e:
+            print(f"Error loading station index: {e}")
+
+    def _load_matrix(self, path, typecode, default, indices=False):
+        """把站名 x 站名的CSV矩阵读成按行展开的 array；缺失的站对填 default
+
+        indices 为 True 时矩阵的值是该CSV表头中的站点下标，需要换算成本图的下标。
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            header = next(reader)[1:]  # 第一行是站名，第一列是表头
+            rows = list(reader)
+        if not self.station_index:
+            # 第一个矩阵决定站名 -> 下标的映射
+            self.station_names = header
+            self.station_index = {name: i for i, name in enumerate(header)}
+        n = len(self.station_names)
+        row_names = [row[0] for row in rows]
+        if header == self.station_names and row_names == self.station_names:
+            # 常见情况：行列顺序与下标一致，整体一次解析
+            return array(typecode, [int(value) for row in rows for value in row[1:]])
+        # 顺序不一致时逐个放到对应下标
+        matrix = array(typecode, [default]) * (n * n)
+        for row in rows:
+            i = self.station_index.get(row[0])
+            if i is None:
+                continue
+            for name, value in zip(header, row[1:]):
+                j = self.station_index.get(name)
+                if j is not None:
+                    matrix[i * n + j] = self._convert_value(header, int(value), default) if indices else int(value)
+        return matrix
+
+    def _convert_value(self, header, value, default):
+        """把CSV表头中的站点下标换算成本图的下标"""
+        if value >= len(header):
+            return default
+        return self.station_index.get(header[value], default)
+
+    def load_stations(self):
+        """加载上海地铁站点数据"""
+        try:
+            with open('data/StationInfo.csv', 'r', encoding='utf-8') as f:
+                reader = csv.DictReader(f)
+                for row in reader:
+                    name = row['站名']
+                    district = row['区县']
+                    # 解析线路，非空值才加入列表
+                    lines = [row[f'线路{i}'] for i in range(1, 6) if row[f'线路{i}']]
+                    try:
+                        opening_year = int(row['开通年份']) if row['开通年份'] else 0
+                    except ValueError:
+                        opening_year = 0 # 如果年份不是数字，则设为0
+
+                    # 存储站点信息
+                    self.stations[name] = {
+                        "district": district,
+                        "lines": lines,
+                        "opening_year": opening_year
+                    }
+                    # 线路 -> 按文件顺序排列的站点
+                    for line in lines:
+                        self.lines.setdefault(line, []).append(name)
+                    self._add_line_bits(name, lines)
+                    
+        except FileNotFoundError:
+            print("Error: data/StationInfo.csv not found.")
+        except Exception as e:
+            print(f"Error loading station info: {e}")
+    
+    def _route_vectors(self, station: str):
+        """各站到 station 的 (最少站数, 最少换乘次数, 下一站, Pareto 前沿) 向量，按站点下标取值；站点不存在时返回 None
+
+        路线是双向的，矩阵对称（增量修改也保持对称），所以直接取 station 那一行；下一站矩阵本身按终点站存行。
+        矩阵不在内存中时（low_memory）从CSV里读出这一行；没有 Pareto 前沿表时（low_memory、增量修改之后）现场计算。
+        """
+        j = self.station_index.get(station)
+        if j is None:
+            return None
+        n = len(self.station_names)
+        if self.pareto_offsets:
+            offsets = self.pareto_offsets[j * n:(j + 1) * n + 1]
+            fronts = [list(zip(self.pareto_stations[a:b], self.pareto_transfers[a:b])) for a, b in zip(offsets, offsets[1:])]
+        else:
+            fronts = self._pareto_fronts(station)
+        if self.shortest_routes and self.minimum_changes:
+            return (array('H', self.shortest_routes[j * n:(j + 1) * n]),
+                    array('B', self.minimum_changes[j * n:(j + 1) * n]),
+                    array('H', self.next_hops[j * n:(j + 1) * n]),
+                    fronts)
+        return (self._read_vector('data/ShortestRoute.csv', station, 'H', self.NO_ROUTE_STATIONS),
+                self._read_vector('data/MinimumChange.csv', station, 'B', self.NO_ROUTE_TRANSFERS),
+                self._read_vector('data/NextHop.csv', station, 'H', self.NO_NEXT_HOP, indices=True),
+                fronts)
+
+    def _pareto_fronts(self, station: str):
+        """从 station 出发在 (站点, 线路) 状态图上做多目标标号法，返回各站的 Pareto 前沿（与 precompute.py 相同）
+
+        标号按 (站数, 换乘次数) 的字典序出堆，同一状态上后出堆的标号只有换乘更少时才不被支配。
+        """
+        line_adjacency = defaultdict(lambda: defaultdict(list))  # 线路 -> 站下标 -> 同线相邻站下标
+        station_lines = defaultdict(list)
+        for (a, b), lines in self.sections.items():
+            i, j = self.station_index.get(a), self.station_index.get(b)
+            if i is None or j is None:
+                continue
+            for line in lines:
+                line_adjacency[line][i].append(j)
+                line_adjacency[line][j].append(i)
+                for k in (i, j):
+                    if line not in station_lines[k]:
+                        station_lines[k].append(line)
+
+        source = self.station_index[station]
+        fronts = [[] for _ in self.station_names]
+        best = {}  # (站, 线路) -> 已出堆标号中最少的换乘次数
+        heap = [(0, 0, source, line) for line in station_lines[source]]
+        if not heap:
+            fronts[source].append((0, 0))
+        while heap:
+            stations, transfers, s, line = heapq.heappop(heap)
+            if best.get((s, line), transfers + 1) <= transfers:
+                continue
+            best[(s, line)] = transfers
+            if not fronts[s] or transfers < fronts[s][-1][1]:
+                fronts[s].append((stations, transfers))
+            for t in line_adjacency[line][s]:
+                if best.get((t, line), transfers + 1) > transfers:
+                    heapq.heappush(heap, (stations + 1, transfers, t, line))
+            for other in station_lines[s]:
+                if other != line and best.get((s, other), transfers + 2) > transfers + 1:
+                    heapq.heappush(heap, (stations, transfers + 1, s, other))
+        return fronts
+
+    def _read_vector(self, path, station, typecode, default, indices=False):
+        """从矩阵CSV中读出 station 那一行；缺失的站填 default，indices 的含义同 _load_matrix"""
+        vector = array(typecode, [default]) * len(self.station_names)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                reader = csv.reader(f)
+                header = next(reader)[1:]
+                for row in reader:
+                    if row[0] != station:
+                        continue
+                    for name, value in zip(header, row[1:]):
+                        j = self.station_index.get(name)
+                        if j is not None:
+                            vector[j] = self._convert_value(header, int(value), default) if indices else int(value)
+                    break
+        except FileNotFoundError:
+            print(f"Warning: {path} not found. Calculating distances will fail.")
+        except Exception as e:
+            print(f"Error loading {path}: {e}")
+        return vector
+
+    def _add_line_bits(self, name, lines):
+        """给新出现的线路分配一位，并把这些线路加入站点 name 的线路位集"""
+        mask = self.station_masks.get(name, 0)
+        for line in lines:
+            mask |= 1 << self.line_bits.setdefault(line, len(self.line_bits))
+        self.station_masks[name] = mask
+
+    def lines_mask(self, lines: List[str]):
+        """线路列表对应的位集；有未知线路时返回 None"""
+        mask = 0
+        for line in lines:
+            if line not in self.line_bits:
+                return None
+            mask |= 1 << self.line_bits[line]
+        return mask
+
+    def compare_lines(self, guess: str, answer: str) -> str:
+        """比较两站的线路：'perfect' 完全相同，'partial' 有交集，'none' 没有交集"""
+        guess_mask = self.station_masks.get(guess, 0)
+        answer_mask = self.station_masks.get(answer, 0)
+        if guess_mask == answer_mask:
+            return 'perfect'
+        return 'partial' if guess_mask & answer_mask else 'none'
+
+    def stations_on_lines(self, lines: List[str]) -> List[str]:
+        """同时位于 lines 中所有线路上的站点，按站名排序"""
+        want = self.lines_mask(lines)
+        if want is None:
+            return []
+        return sorted(name for name, mask in self.station_masks.items() if mask & want == want)
+
+    def calculate_min_stations(self, start_station: str, end_station: str) -> int:
+        """计算最小站数 - 从终点站的距离向量中按下标取值"""
+        i = self.station_index.get(start_station)
+        vectors = self.route_vectors(end_station)
+        if i is None or vectors is None:
+            return self.NO_ROUTE_STATIONS
+        return vectors[0][i]
+
+    def calculate_min_transfers(self, start_station: str, end_station: str) -> int:
+        """计算最小换乘次数 - 从终点站的换乘向量中按下标取值"""
+        i = self.station_index.get(start_station)
+        vectors = self.route_vectors(end_station)
+        if i is None or vectors is None:
+            return self.NO_ROUTE_TRANSFERS
+        return vectors[1][i]
+
+    def route_options(self, start_station: str, end_station: str) -> List[Dict]:
+        """两站之间所有非劣的 (站数, 换乘次数) 组合，按站数递增（换乘次数递减）；不连通或站点不存在时为空列表
+
+        第一项就是"最少站数"，最后一项就是"最少换乘"，两者不同时可以分别作为提示。
+        """
+        i = self.station_index.get(start_station)
+        vectors = self.route_vectors(end_station)
+        if i is None or vectors is None:
+            return []
+        return [{'stations': stations, 'transfers': transfers} for stations, transfers in vectors[3][i]]
+
+    def find_route(self, start_station: str, end_station: str):
+        """还原最少站数路线：沿下一站向量走到终点，O(路线长度)
+
+        返回 {'stations': [...], 'segments': [{'line', 'stations'}], 'transfer_stations': [...]}，
+        无法还原时返回 None。分段时在这条路线上尽量少换乘（同一区间属于多条线路时尽量沿用当前线路）。
+        """
+        i = self.station_index.get(start_station)
+        vectors = self.route_vectors(end_station)
+        if i is None or vectors is None:
+            return None
+        next_hops = vectors[2]
+        n = len(self.station_names)
+        j = self.station_index[end_station]
+        path = [i]
+        while path[-1] != j:
+            hop = next_hops[path[-1]]
+            if hop >= n or len(path) > n:
+                return None
+            path.append(hop)
+        stations = [self.station_names[k] for k in path]
+
+        segments = []
+        current = None  # 当前分段仍可能乘坐的线路
+        for a, b in zip(stations, stations[1:]):
+            key = (a, b) if a < b else (b, a)
+            lines = self.sections.get(key) or ['']
+            if current is not None:
+                still = [line for line in current if line in lines]
+                if still:
+                    current = still
+                    segments[-1]['stations'].append(b)
+                    continue
+                segments[-1]['line'] = current[0]
+            current = lines
+            segments.append({'line': None, 'stations': [a, b]})
+        if segments:
+            segments[-1]['line'] = current[0]
+        return {
+            'stations': stations,
+            'segments': segments,
+            'transfer_stations': [segment['stations'][0] for segment in segments[1:]],
+        }
+
+    # --- 增量修改：新开站点 / 区间 / 线路 ---
+    # 只支持增加，不支持删除：在两个已有站之间插入新站时原有的直达区间会被保留。
+
+    def add_station(self, name: str, lines: List[str], neighbours: List[str],
+                    district: str = '', opening_year: int = 0, persist: bool = True):
+        """新增站点：所在线路 lines，与已有站点 neighbours 直接相连"""
+        if not name or name in self.station_index:
+            raise ValueError(f"station already exists: {name}")
+        if name in neighbours:
+            raise ValueError(f"station cannot neighbour itself: {name}")
+        for neighbour in neighbours:
+            self._check_station(neighbour)
+        self._make_writable()
+        self.stations[name] = {"district": district, "lines": [], "opening_year": opening_year}
+        self._add_matrix_row(name)
+        for neighbour in neighbours:
+            # 区间所属线路：与相邻站共有的线路，没有则取新站的第一条线路
+            shared = [line for line in lines if line in self.stations[neighbour]['lines']]
+            self._add_section(name, neighbour, (shared or lines or [''])[0])
+        if neighbours:
+            # 新站到各站的站数 = 1 + 第一个相邻站到各站的站数，其余相邻站当作新增区间处理
+            self._copy_row_plus_one(name, neighbours[0])
+            for neighbour in neighbours[1:]:
+                self._relax_edge(name, neighbour)
+        for line in lines:
+            self._join_line(line, [name])
+        if persist:
+            self._save_edit({'op': 'add_station', 'name': name, 'lines': lines, 'neighbours': neighbours,
+                             'district': district, 'opening_year': opening_year})
+
+    def add_edge(self, station_a: str, station_b: str, line: str, persist: bool = True):
+        """在两个已有站点之间新增 line 线路上的区间"""
+        for name in (station_a, station_b):
+            self._check_station(name)
+        if station_a == station_b:
+            raise ValueError(f"section must join two different stations: {station_a}")
+        self._make_writable()
+        self._add_section(station_a, station_b, line)
+        self._relax_edge(station_a, station_b)
+        joined = [name for name in (station_a, station_b) if line not in self.stations[name]['lines']]
+        if joined:
+            self._join_line(line, joined)
+        if persist:
+            self._save_edit({'op': 'add_edge', 'stations': [station_a, station_b], 'line': line})
+
+    def add_line(self, line: str, stations: List[str], persist: bool = True):
+        """新增（或延长）线路：stations 为按顺序排列的站名，未知站名会作为新站点加入
+
+        先检查整条线路再修改，某一站不合法时整条线路都不加入。
+        """
+        prev = None
+        added = set()
+        for name in stations:
+            if not name:
+                raise ValueError(f"empty station name on line {line}")
+            if name == prev:
+                raise ValueError(f"station repeated consecutively on line {line}: {name}")
+            if name not in self.station_index and name not in added:
+                added.add(name)
+            elif name not in added:
+                self._check_station(name)
+            prev = name
+        prev = None
+        for name in stations:
+            if name not in self.station_index:
+                self.add_station(name, [line], [prev] if prev else [], persist=False)
+            elif prev is not None:
+                self.add_edge(prev, name, line, persist=False)
+            elif line not in self.stations[name]['lines']:
+                self._make_writable()
+                self._join_line(line, [name])
+            prev = name
+        if persist:
+            self._save_edit({'op': 'add_line', 'line': line, 'stations': stations})
+
+    def _check_station(self, name):
+        """增量修改前的检查：站点必须同时在距离矩阵和站点信息中"""
+        if name not in self.station_index or name not in self.stations:
+            raise ValueError(f"unknown station: {name}")
+
+    def load_edits(self):
+        """在基础数据之上重放增量修改记录"""
+        try:
+            with open(self.EDITS_FILE, 'r', encoding='utf-8') as f:
+                edits = [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Error loading metro edits: {e}")
+            return
+        for edit in edits:
+            try:
+                if edit['op'] == 'add_station':
+                    self.add_station(edit['name'], edit['lines'], edit['neighbours'],
+                                     edit.get('district', ''), edit.get('opening_year', 0), persist=False)
+                elif edit['op'] == 'add_edge':
+                    self.add_edge(*edit['stations'], edit['line'], persist=False)
+                elif edit['op'] == 'add_line':
+                    self.add_line(edit['line'], edit['stations'], persist=False)
+            except Exception as e:
+                print(f"Error applying metro edit {edit}: {e}")
+
+    def _save_edit(self, edit):
+        try:
+            with open(self.EDITS_FILE, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(edit, ensure_ascii=False) + '\n')
+        except Exception as e:
+            print(f"Error saving metro edit: {e}")
+
+    def _make_writable(self):
+        """数据包中的矩阵是只读的 mmap 视图，修改前先复制成 array；low_memory 模式下先读入完整矩阵
+
+        Pareto 前沿表不做增量更新，修改后丢弃，改为按需计算。
+        """
+        self.route_vectors.cache_clear()
+        self.features = None
+        self.sorted_stations = None
+        self.difficulty = None
+        self.samplers = {}
+        self.pareto_offsets = array('I')
+        self.pareto_stations = array('H')
+        self.pareto_transfers = array('B')
+        if not self.shortest_routes or not self.minimum_changes:
+            self.load_distances_and_changes()
+        if isinstance(self.shortest_routes, memoryview):
+            self.shortest_routes = array('H', self.shortest_routes)
+        if isinstance(self.minimum_changes, memoryview):
+            self.minimum_changes = array('B', self.minimum_changes)
+        if isinstance(self.next_hops, memoryview):
+            self.next_hops = array('H', self.next_hops)
+
+    def _add_matrix_row(self, name):
+        """矩阵扩大一行一列（新站到其他站暂时视为不可达）"""
+        n = len(self.station_names)
+        for attr, default in (('shortest_routes', self.NO_ROUTE_STATIONS), ('minimum_changes', self.NO_ROUTE_TRANSFERS)):
+            old = getattr(self, attr)
+            new = array(old.typecode)
+            for i in range(n):
+                new.extend(old[i * n:(i + 1) * n])
+                new.append(default)
+            new.extend([default] * n)
+            new.append(0)
+            setattr(self, attr, new)
+        old = self.next_hops
+        self.next_hops = array('H')
+        for i in range(n):
+            self.next_hops.extend(old[i * n:(i + 1) * n])
+            self.next_hops.append(self.NO_NEXT_HOP)
+        self.next_hops.extend([self.NO_NEXT_HOP] * n)
+        self.next_hops.append(n)
+        self.station_index[name] = n
+        self.station_names.append(name)
+
+    def _copy_row_plus_one(self, name, neighbour):
+        """新站只有一个相邻站时，它到各站的站数就是相邻站的站数 + 1"""
+        n = len(self.station_names)
+        d = self.shortest_routes
+        p = self.next_hops
+        w, v = self.station_index[name], self.station_index[neighbour]
+        for y in range(n):
+            if y != w and d[v * n + y] < self.NO_ROUTE_STATIONS:
+                d[w * n + y] = d[y * n + w] = d[v * n + y] + 1
+                # 从新站出发先到相邻站；从 y 去新站沿去相邻站的路线走
+                p[y * n + w] = v
+                p[w * n + y] = w if y == v else p[v * n + y]
+
+    def _relax_edge(self, station_a, station_b):
+        """新增区间 a-b 后更新最少站数：只有 d(x,a)+1 < d(x,b) 的 x 和 d(b,y)+1 < d(a,y) 的 y 组成的站对可能变短"""
+        n = len(self.station_names)
+        d = self.shortest_routes
+        p = self.next_hops
+        a, b = self.station_index[station_a], self.station_index[station_b]
+        for u, v in ((a, b), (b, a)):
+            xs = [x for x in range(n) if d[x * n + u] + 1 < d[x * n + v]]
+            ys = [y for y in range(n) if d[v * n + y] + 1 < d[u * n + y]]
+            for x in xs:
+                base = d[x * n + u] + 1
+                for y in ys:
+                    candidate = base + d[v * n + y]
+                    if candidate < d[x * n + y]:
+                        d[x * n + y] = d[y * n + x] = candidate
+                        # 新路线 x -> ... -> u -> v -> ... -> y（xs 与 ys 不相交，读到的下一站都未在本轮修改）
+                        p[y * n + x] = v if x == u else p[u * n + x]
+                        p[x * n + y] = u if y == v else p[v * n + y]
+
+    def _line_vector(self, line):
+        """从线路 line 上出发到各站的最少换乘次数
+
+        取该线路上只属于这条线的站的那一行；没有这种站时用线路上各站的行 + 1 作为上界。
+        """
+        n = len(self.station_names)
+        t = self.minimum_changes
+        members = [self.station_index[name] for name in self.lines.get(line, []) if name in self.station_index]
+        exclusive = [i for i in members if self.stations[self.station_names[i]]['lines'] == [line]]
+        vector = [self.NO_ROUTE_TRANSFERS] * n
+        for i in exclusive or members:
+            offset = 0 if exclusive else 1
+            row = t[i * n:(i + 1) * n]
+            vector = [min(a, b + offset) for a, b in zip(vector, row)]
+        for i in members:
+            vector[i] = 0
+        return vector
+
+    def _join_line(self, line, names):
+        """站点 names 加入线路 line 后更新最少换乘：新路线都要经过 line，
+        所以 t(x,y) = min(t(x,y), T(x) + T(y))，T 为加入后从 line 出发到各站的最少换乘次数"""
+        n = len(self.station_names)
+        t = self.minimum_changes
+        vector = self._line_vector(line)
+        for name in names:
+            # 从 line 换乘到新加入的站原有的线路
+            i = self.station_index[name]
+            vector = [min(a, b + 1) for a, b in zip(vector, t[i * n:(i + 1) * n])]
+        for name in names:
+            self.stations[name]['lines'].append(line)
+            members = self.lines.setdefault(line, [])
+            if name not in members:
+                members.append(name)
+            self._add_line_bits(name, [line])
+        for name in self.lines[line]:
+            # 站点信息中列出、但距离矩阵里没有的站不参与计算（与 _line_vector 一致）
+            if name in self.station_index:
+                vector[self.station_index[name]] = 0
+
+        for x in range(n):
+            a = vector[x]
+            if a >= self.NO_ROUTE_TRANSFERS:
+                continue
+            row = x * n
+            for y in range(n):
+                candidate = a + vector[y]
+                if candidate < t[row + y]:
+                    t[row + y] = candidate
+
+    # --- 猜测反馈的批量计算：一次算出某个猜测对所有可能答案的反馈 ---
+
+    def _build_features(self):
+        """按站点下标排列的特征：线路位集、区县编号、开通年份"""
+        district_codes = {}
+        masks, districts, years = [], array('H'), array('H')
+        for name in self.station_names:
+            info = self.stations.get(name, {})
+            masks.append(self.station_masks.get(name, 0))
+            districts.append(district_codes.setdefault(info.get('district', ''), len(district_codes)))
+            years.append(info.get('opening_year', 0))
+        self.features = (masks, districts, years)
+        return self.features
+
+    @staticmethod
+    def _feedback_code(district_match, lines_match, year_relation, min_stations, min_transfers):
+        """把一次猜测的反馈合成一个整数，反馈相同当且仅当编码相同"""
+        return (((min_stations * 16 + min_transfers) * 3 + lines_match) * 3 + year_relation) * 2 + district_match
+
+    def result_code(self, result: Dict) -> int:
+        """submit_guess 返回的单次结果对应的反馈编码"""
+        return self._feedback_code(bool(result['district_match']), self.LINES_MATCH.index(result['lines_match']),
+                                   self.YEAR_RELATION.index(result['year_relation']),
+                                   result['min_stations'], result['min_transfers'])
+
+    def feedback_codes(self, guess: str):
+        """猜 guess 时以每个站为答案得到的反馈编码，按站点下标排列；站点不存在时返回 None
+
+        距离取矩阵中 guess 那一行（矩阵对称，与 calculate_min_stations(guess, 答案) 相同），其余特征按下标一次扫描。
+        """
+        g = self.station_index.get(guess)
+        if g is None:
+            return None
+        n = len(self.station_names)
+        if self.shortest_routes and self.minimum_changes:
+            routes = self.shortest_routes[g * n:(g + 1) * n]
+            changes = self.minimum_changes[g * n:(g + 1) * n]
+        else:
+            routes, changes = self.route_vectors(guess)[:2]
+        return self._feedback_row(g, routes, changes)
+
+    def _feedback_row(self, g, routes, changes):
+        """由第 g 个站到各站的最少站数 / 最少换乘向量算出猜该站时的反馈编码"""
+        masks, districts, years = self.features or self._build_features()
+        mask, district, year = masks[g], districts[g], years[g]
+        code = self._feedback_code
+        return array('I', [
+            code(d == district, 2 if m == mask else 1 if m & mask else 0, (year > y) - (year < y) + 1, stations, transfers)
+            for stations, transfers, m, d, y in zip(routes, changes, masks, districts, years)
+        ])
+
+    def remaining_candidates(self, guesses: List[Dict]) -> List[str]:
+        """与已有猜测结果（submit_guess 返回的 result 列表）都一致的答案站，按站名排序"""
+        candidates = range(len(self.station_names))
+        for result in guesses:
+            codes = self.feedback_codes(result.get('guess'))
+            if codes is None:
+                continue
+            expected = self.result_code(result)
+            candidates = [j for j in candidates if codes[j] == expected]
+        return sorted(self.station_names[j] for j in candidates if self.station_names[j] in self.stations)
+
+    # --- 出题难度 ---
+
+    def station_difficulty(self) -> Dict[str, float]:
+        """每个站作为答案的难度：随便猜一个站之后，平均还剩多少个与反馈一致的候选站（越大越难）
+
+        对每个猜测按反馈编码给所有答案分组，一次扫描 n*n 个反馈编码。只计算一次（加锁），
+        启动时由 warm_up 在后台线程中算好，出题请求不必等待。
+        """
+        with self.difficulty_lock:
+            if self.difficulty is None:
+                names = self.get_all_stations()
+                index = [self.station_index[name] for name in names]
+                totals = [0] * len(names)
+                for g, routes, changes in self._matrix_rows():
+                    if self.station_names[g] not in self.stations:
+                        continue
+                    codes = self._feedback_row(g, routes, changes)
+                    codes = [codes[j] for j in index]
+                    counts = Counter(codes)
+                    for k, code in enumerate(codes):
+                        totals[k] += counts[code]
+                self.difficulty = {name: total / len(names) for name, total in zip(names, totals)}
+            return self.difficulty
+
+    def _matrix_rows(self):
+        """依次给出每个站的 (下标, 最少站数行, 最少换乘行)
+
+        矩阵不在内存中时（low_memory）顺序读一遍两个CSV，不经过 route_vectors 的缓存；
+        两个文件的行顺序不一致时退回按站名读取。
+        """
+        n = len(self.station_names)
+        if self.shortest_routes and self.minimum_changes:
+            for g in range(n):
+                yield g, self.shortest_routes[g * n:(g + 1) * n], self.minimum_changes[g * n:(g + 1) * n]
+            return
+        with open('data/ShortestRoute.csv', 'r', encoding='utf-8') as routes_file, \
+                open('data/MinimumChange.csv', 'r', encoding='utf-8') as changes_file:
+            routes_reader, changes_reader = csv.reader(routes_file), csv.reader(changes_file)
+            routes_header, changes_header = next(routes_reader)[1:], next(changes_reader)[1:]
+            routes_columns = [self.station_index.get(name) for name in routes_header]
+            changes_columns = [self.station_index.get(name) for name in changes_header]
+            for routes_row in routes_reader:
+                g = self.station_index.get(routes_row[0])
+                changes_row = next(changes_reader, None)
+                if g is None:
+                    continue
+                routes = array('H', [self.NO_ROUTE_STATIONS]) * n
+                for j, value in zip(routes_columns, routes_row[1:]):
+                    if j is not None:
+                        routes[j] = int(value)
+                if changes_row is None or changes_row[0] != routes_row[0]:
+                    changes = self._read_vector('data/MinimumChange.csv', routes_row[0], 'B', self.NO_ROUTE_TRANSFERS)
+                else:
+                    changes = array('B', [self.NO_ROUTE_TRANSFERS]) * n
+                    for j, value in zip(changes_columns, changes_row[1:]):
+                        if j is not None:
+                            changes[j] = int(value)
+                yield g, routes, changes
+
+    def warm_up(self):
+        """在后台线程中预先算好出题用的难度表"""
+        thread = threading.Thread(target=self.station_difficulty, name='metro-difficulty', daemon=True)
+        thread.start()
+        return thread
+
+    def difficulty_levels(self) -> Dict[str, str]:
+        """按难度排名三等分：站点 -> 'easy' / 'normal' / 'hard'"""
+        difficulty = self.station_difficulty()
+        ranked = sorted(difficulty, key=lambda name: (difficulty[name], name))
+        levels = len(self.DIFFICULTY_LEVELS)
+        return {name: self.DIFFICULTY_LEVELS[rank * levels // len(ranked)] for rank, name in enumerate(ranked)}
+
+    def sample_answer(self, mode: str = None) -> str:
+        """随机抽一个答案站：mode 为 'easy' / 'hard' 时按难度等级加权（别名表，O(1)），否则均匀抽取"""
+        weights = self.LEVEL_WEIGHTS.get(mode)
+        if weights is None:
+            return random.choice(self.get_all_stations())
+        sampler = self.samplers.get(mode)
+        if sampler is None:
+            levels = self.difficulty_levels()
+            names = self.get_all_stations()
+            sampler = AliasTable(names, [weights[self.DIFFICULTY_LEVELS.index(levels[name])] for name in names])
+            self.samplers[mode] = sampler
+        return sampler.sample()
+
+    def get_all_stations(self) -> List[str]:
+        """获取所有站点列表（按站名排序，结果会被缓存共享，调用方不要修改）"""
+        if self.sorted_stations is None:
+            self.sorted_stations = sorted(self.stations)
+        return self.sorted_stations
+    
+    def get_station_info(self, station_name: str) -> Dict:
+        """获取站点信息"""
+        return self.stations.get(station_name, {})
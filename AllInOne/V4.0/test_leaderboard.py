@@ -0,0 +1,55 @@
+# test_leaderboard.py
+# 排行榜日志模式的崩溃恢复测试。在 AllInOne/V4.0 目录下运行：python -m unittest test_leaderboard
+# 导入 app 时设置 LEADERBOARD_DB 指向临时目录，避免在当前目录创建 Leaderboard.csv。
+import os, tempfile, threading, unittest
+
+_module_dir = tempfile.TemporaryDirectory()
+os.environ.setdefault('LEADERBOARD_DB', os.path.join(_module_dir.name, 'Leaderboard.db'))
+from app import Leaderboard
+
+class JournalRecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.dir.name, 'Leaderboard.csv')
+        self.journal_filename = os.path.join(self.dir.name, 'Leaderboard.journal')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_torn_tail_does_not_swallow_next_update(self):
+        board = Leaderboard(self.filename, journal=True)
+        board.add_score('C', 'Y', '猜铁', True, 2)
+        board.compact()
+        # 模拟崩溃：日志末尾只写了半行
+        with open(self.journal_filename, 'a', encoding='utf-8') as f:
+            f.write('2026-10-17 10:00:00,C,Z,1,')
+
+        board = Leaderboard(self.filename, journal=True)
+        self.assertIsNone(board.get_entry('C', 'Z'))
+        board.add_score('C', 'D', '猜铁', True, 3)
+
+        board = Leaderboard(self.filename, journal=True)
+        self.assertIsNotNone(board.get_entry('C', 'Y'))
+        entry = board.get_entry('C', 'D')
+        self.assertIsNotNone(entry)
+        self.assertEqual(entry.attempts_of('猜铁'), 3)
+
+    def test_concurrent_updates_replay_to_latest_row(self):
+        board = Leaderboard(self.filename, journal=True, compact_every=10 ** 6)
+
+        def submit(attempts):
+            for _ in range(20):
+                board.add_score('C', 'D', '猜铁', False, attempts)
+
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(1, 9)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        expected = board.get_entry('C', 'D').to_row()
+        reloaded = Leaderboard(self.filename, journal=True)
+        self.assertEqual(reloaded.get_entry('C', 'D').to_row(), expected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,8 @@ def bearing(latlong1, latlong2):
     da = math.radians(latlong2[1]) - math.radians(latlong1[1])
     y = math.sin(da) * math.cos(b2)
     x = math.cos(b1) * math.sin(b2) - math.sin(b1) * math.cos(b2) * math.cos(da)
-    bearing = (math.degrees(math.atan2(y, x)) + 360) % 360
+    return _compass((math.degrees(math.atan2(y, x)) + 360) % 360)
+def _compass(bearing):
     if 0 <= bearing < 22.5:    return 'N'
     elif 22.5 <= bearing < 67.5:    return 'NE'
     elif 67.5 <= bearing < 112.5:    return 'E'
@@ -36,3 +37,65 @@ def dist(latlong1, latlong2):
     distance = R * angle
     if distance > 100: return round(distance / 100) * 100
     return round(distance / 10) * 10
+
+# 批量版本：参数可以是单个 [lat, lon] 或 [[lat, lon], ...]。
+# dists / bearings 逐对计算，单个点会广播到另一边的每个点（一对多、多对一）；
+# *_matrix 计算两组点的所有组合（多对多），返回 len(latlongs1) 行、len(latlongs2) 列。
+# 每个点的三角函数只算一次，结果与逐个调用 dist / bearing 完全相同。
+def _as_points(latlongs):
+    # 单个点是两个数；N×2 的列表、元组或数组（包括 N 为 0 或 2）按点列表处理
+    if len(latlongs) == 2 and not hasattr(latlongs[0], '__len__'): return [latlongs]
+    return list(latlongs)
+
+def _broadcast(values1, values2):
+    if len(values1) == 1: return values1 * len(values2), values2
+    if len(values2) == 1: return values1, values2 * len(values1)
+    if len(values1) != len(values2): raise ValueError("point lists must have the same length or a single point")
+    return values1, values2
+
+def _unit_vector(latlong):
+    return (
+        math.cos(math.radians(latlong[1])) * math.cos(math.radians(latlong[0])),
+        math.sin(math.radians(latlong[1])) * math.cos(math.radians(latlong[0])),
+        math.sin(math.radians(latlong[0]))
+        )
+
+def _round_distance(distance):
+    if distance > 100: return round(distance / 100) * 100
+    return round(distance / 10) * 10
+
+def _vector_dist(coords1, coords2):
+    linedist = (
+        (coords1[0] - coords2[0]) ** 2 + \
+        (coords1[1] - coords2[1]) ** 2 + \
+        (coords1[2] - coords2[2]) ** 2
+        ) ** 0.5
+    return _round_distance(R * math.acos((2 - linedist ** 2) / 2))
+
+def _bearing_terms(latlong):
+    b = math.radians(latlong[0])
+    return math.radians(latlong[1]), math.sin(b), math.cos(b)
+
+def _terms_bearing(terms1, terms2):
+    da = terms2[0] - terms1[0]
+    y = math.sin(da) * terms2[2]
+    x = terms1[2] * terms2[1] - terms1[1] * terms2[2] * math.cos(da)
+    return _compass((math.degrees(math.atan2(y, x)) + 360) % 360)
+
+def dists(latlongs1, latlongs2):
+    vectors1, vectors2 = _broadcast([_unit_vector(p) for p in _as_points(latlongs1)],
+                                    [_unit_vector(p) for p in _as_points(latlongs2)])
+    return [_vector_dist(a, b) for a, b in zip(vectors1, vectors2)]
+
+def dist_matrix(latlongs1, latlongs2):
+    vectors2 = [_unit_vector(p) for p in _as_points(latlongs2)]
+    return [[_vector_dist(a, b) for b in vectors2] for a in map(_unit_vector, _as_points(latlongs1))]
+
+def bearings(latlongs1, latlongs2):
+    terms1, terms2 = _broadcast([_bearing_terms(p) for p in _as_points(latlongs1)],
+                                [_bearing_terms(p) for p in _as_points(latlongs2)])
+    return [_terms_bearing(a, b) for a, b in zip(terms1, terms2)]
+
+def bearing_matrix(latlongs1, latlongs2):
+    terms2 = [_bearing_terms(p) for p in _as_points(latlongs2)]
+    return [[_terms_bearing(a, b) for b in terms2] for a in map(_bearing_terms, _as_points(latlongs1))]
@@ -6,6 +6,8 @@ from data import nation_template
 from problems import problem_set
 from localization import localization
 from calculator import dist, bearing
+from name_index import NameIndex
+nation_index = NameIndex([nation[0] + nation[1] + nation[2] for nation in nation_template])
 class MainWindow(QMainWindow):
     def __init__(self, parent=None):
         super(MainWindow, self).__init__(parent)
@@ -78,12 +80,8 @@ class MainWindow(QMainWindow):
         if self.game_status == 1 or self.game_status == 2:
             self.new_game()
             return
-        nation_guess = -1
-        for i in range(len(nation_template)):
-            if self.nationenter.text().lower() in list(map(lambda x: x.lower(), nation_template[i][0] + nation_template[i][1] + nation_template[i][2])):
-                nation_guess = i
-                break
-        if nation_guess == -1:
+        nation_guess = nation_index.lookup(self.nationenter.text())
+        if nation_guess is None:
             self.errorlabel.setText(localization[self.lang]['notexist'] % self.nationenter.text())
             return
         self.guesses -= 1
@@ -0,0 +1,311 @@
+# precompute.py
+# 由 NameList.txt 生成 ShortestRoute.csv（最少站数）和 MinimumChange.csv（最少换乘次数），
+# 取代 ShortestRouteCalc.cpp / MinimumChangeCalc.cpp 的 Floyd-Warshall。
+# 同时生成 NextHop.csv（最少站数路线的下一站）和 SectionLines.csv（每个区间所属的线路），用于还原路线；
+# 以及 ParetoRoutes.csv（每对站之间所有非劣的 (站数, 换乘次数) 组合）。
+#
+# 最少站数：站点图不带权，从每个站做一次 BFS，O(n·(V+E))。
+#   BFS 树中每个站的父节点就是它去往树根的下一站，所以 NextHop 的行是终点站、列是当前站。
+# 最少换乘：在 (站点, 线路) 状态图上做 0-1 BFS，沿线路走到相邻站代价 0，同站换线代价 1。
+#   "X支线" 与 "X" 视为同一条线路（与 MinimumChangeCalc.cpp 使用的 NameList copy.txt 一致）。
+# Pareto 前沿：同一状态图上的多目标标号法，标号按 (站数, 换乘次数) 的字典序出堆。
+#
+# 用法：python precompute.py [NameList.txt] [输出目录] [--pareto] [--plain-next-hops]
+#   默认不生成 ParetoRoutes.csv（它的耗时比其余步骤加起来还长），线网有变化时加 --pareto 一起重新生成。
+import argparse, csv, heapq, os, struct
+from array import array
+from collections import deque
+
+# 两站不连通时写入的值，与 app.py 中查不到站点时的返回值一致
+NO_ROUTE_STATIONS = 100
+NO_ROUTE_TRANSFERS = 10
+# 不连通时的下一站下标
+NO_NEXT_HOP = 65535
+
+MATRIX_MAGIC = b'XCMATRIX'
+MATRIX_VERSION = 2
+MATRIX_HEADER = struct.Struct('=8sHII')
+
+def read_name_list(path):
+    """读取 NameList.txt：线路数 T，然后每条线路依次是 线路名、站数、各站名（以空白分隔）
+
+    返回 [(线路名, [站名, ...]), ...]
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        tokens = f.read().split()
+    pos = 0
+    def take():
+        nonlocal pos
+        pos += 1
+        return tokens[pos - 1]
+    lines = []
+    for _ in range(int(take())):
+        line_name = take()
+        count = int(take())
+        lines.append((line_name, [take() for _ in range(count)]))
+    return lines
+
+def transfer_line(line_name):
+    """计算换乘时使用的线路名：支线与主线算同一条线路"""
+    return line_name[:-2] if line_name.endswith('支线') else line_name
+
+def build_graph(lines):
+    """返回 (站名列表, 邻接表, 每站所在的换乘线路下标列表, 每条换乘线路上的邻接表)；站名按首次出现的顺序编号"""
+    station_index = {}
+    station_names = []
+    line_index = {}
+    adjacency = []
+    station_lines = []
+    line_adjacency = []  # 线路下标 -> {站下标: [同线相邻站下标]}
+
+    for line_name, stops in lines:
+        li = line_index.setdefault(transfer_line(line_name), len(line_index))
+        if li == len(line_adjacency):
+            line_adjacency.append({})
+        prev = None
+        for name in stops:
+            if name not in station_index:
+                station_index[name] = len(station_names)
+                station_names.append(name)
+                adjacency.append(set())
+                station_lines.append([])
+            si = station_index[name]
+            if li not in station_lines[si]:
+                station_lines[si].append(li)
+            line_adjacency[li].setdefault(si, [])
+            if prev is not None and prev != si:
+                adjacency[si].add(prev)
+                adjacency[prev].add(si)
+                line_adjacency[li][si].append(prev)
+                line_adjacency[li][prev].append(si)
+            prev = si
+    return station_names, adjacency, station_lines, line_adjacency
+
+def section_lines(lines):
+    """返回 [(站名1, 站名2, 线路名), ...]：每个相邻区间及其所属线路（支线按主线计），去重并保持首次出现的顺序"""
+    sections = {}
+    for line_name, stops in lines:
+        for a, b in zip(stops, stops[1:]):
+            if a != b:
+                sections.setdefault((a, b, transfer_line(line_name)), None)
+    return list(sections)
+
+def shortest_routes(adjacency, line_adjacency=None):
+    """从每个站做 BFS，返回按行展开的 n*n (最少站数矩阵, 下一站矩阵)
+
+    下一站矩阵第 s 行第 v 列是从 v 出发去 s 的最少站数路线上的下一站（v == s 时为 s 本身）。
+    给出 line_adjacency 时，在站数相同的下一站中选剩余换乘较少的（按层递推，逐站贪心，不保证全程最优）。
+    """
+    n = len(adjacency)
+    edge_lines = {}
+    for li, neighbours in enumerate(line_adjacency or []):
+        for u, vs in neighbours.items():
+            for v in vs:
+                edge_lines.setdefault((u, v), set()).add(li)
+    # 每站的 [(相邻站, 该区间所属线路)]，按相邻站排序
+    links = [[(u, tuple(sorted(edge_lines.get((v, u), ())))) for u in sorted(adjacency[v])] for v in range(n)]
+    matrix = array('H', [NO_ROUTE_STATIONS]) * (n * n)
+    next_hops = array('H', [NO_NEXT_HOP]) * (n * n)
+    for source in range(n):
+        row = source * n
+        matrix[row + source] = 0
+        next_hops[row + source] = source
+        layers = [[source]]
+        while layers[-1]:
+            depth = len(layers)
+            layer = []
+            for u in layers[-1]:
+                for v, _ in links[u]:
+                    if matrix[row + v] == NO_ROUTE_STATIONS:
+                        matrix[row + v] = depth
+                        next_hops[row + v] = u
+                        layer.append(v)
+            layers.append(layer)
+        if not edge_lines:
+            continue
+        # rides[v]：{线路: 从 v 乘这条线路出发到 source 的最少换乘}；floors[v]：在 v 换乘后再出发的换乘数
+        # （v 的最少换乘 + 1，线路不在 rides[v] 中或代价更高时取它）。source 乘任何线路都是 0
+        rides = [None] * n
+        floors = [0] * n
+        rides[source] = {}
+        for depth, layer in enumerate(layers[1:], 1):
+            for v in layer:
+                ride = {}
+                best = None
+                for u, line_ids in links[v]:
+                    if matrix[row + u] != depth - 1:
+                        continue
+                    costs, floor = rides[u], floors[u]
+                    for li in line_ids:
+                        cost = costs.get(li, floor)
+                        if cost > floor:
+                            cost = floor
+                        if cost < ride.get(li, cost + 1):
+                            ride[li] = cost
+                        if best is None or (cost, u) < best:
+                            best = (cost, u)
+                next_hops[row + v] = best[1]
+                rides[v] = ride
+                floors[v] = best[0] + 1
+    return matrix, next_hops
+
+def minimum_changes(station_lines, line_adjacency):
+    """在 (站点, 线路) 状态图上从每个站做 0-1 BFS，返回按行展开的 n*n 最少换乘矩阵"""
+    n = len(station_lines)
+    # 状态 (站, 线路) 编号为连续整数；rides[k] 为沿同一线路相邻的状态，switches[k] 为同站其他线路的状态
+    state = {}
+    owners = []
+    for s, line_ids in enumerate(station_lines):
+        for li in line_ids:
+            state[(s, li)] = len(owners)
+            owners.append(s)
+    rides = [[state[(t, li)] for t in line_adjacency[li][s]] for s, li in state]
+    switches = [[state[(s, other)] for other in station_lines[s] if other != li] for s, li in state]
+    unreached = 255
+    matrix = array('B', [NO_ROUTE_TRANSFERS]) * (n * n)
+    for source in range(n):
+        row = source * n
+        best = [unreached] * len(owners)  # 状态 -> 最少换乘次数
+        queue = deque()
+        for li in station_lines[source]:
+            k = state[(source, li)]
+            best[k] = 0
+            queue.append((0, k))
+        while queue:
+            cost, k = queue.popleft()
+            if best[k] < cost:
+                continue
+            cell = row + owners[k]
+            if cost < matrix[cell]:
+                matrix[cell] = cost
+            # 沿同一条线路走到相邻站：代价 0，放到队首
+            for t in rides[k]:
+                if best[t] > cost:
+                    best[t] = cost
+                    queue.appendleft((cost, t))
+            # 在本站换乘其他线路：代价 1，放到队尾
+            for t in switches[k]:
+                if best[t] > cost + 1:
+                    best[t] = cost + 1
+                    queue.append((cost + 1, t))
+    return matrix
+
+def pareto_routes(station_lines, line_adjacency):
+    """在 (站点, 线路) 状态图上从每个站做多目标标号法，返回按行展开的 n*n Pareto 前沿列表
+
+    第 s 行第 v 列是从 v 到 s 的所有非劣 (站数, 换乘次数)，按站数递增、换乘次数递减排列；不连通时为空列表。
+    标号按字典序出堆，所以同一状态上后出堆的标号只有换乘更少时才不被支配，同一站上也一样。
+    """
+    n = len(station_lines)
+    fronts = []
+    for source in range(n):
+        row = [[] for _ in range(n)]
+        best = {}  # (站, 线路) -> 已出堆标号中最少的换乘次数
+        heap = [(0, 0, source, li) for li in station_lines[source]]
+        while heap:
+            stations, transfers, s, li = heapq.heappop(heap)
+            if best.get((s, li), transfers + 1) <= transfers:
+                continue
+            best[(s, li)] = transfers
+            if not row[s] or transfers < row[s][-1][1]:
+                row[s].append((stations, transfers))
+            # 沿同一条线路走到相邻站：站数 + 1
+            for t in line_adjacency[li][s]:
+                if best.get((t, li), transfers + 1) > transfers:
+                    heapq.heappush(heap, (stations + 1, transfers, t, li))
+            # 在本站换乘其他线路：换乘次数 + 1
+            for other in station_lines[s]:
+                if other != li and best.get((s, other), transfers + 2) > transfers + 1:
+                    heapq.heappush(heap, (stations, transfers + 1, s, other))
+        fronts.extend(row)
+    return fronts
+
+def write_csv(path, station_names, matrix):
+    """按现有 CSV 格式写出矩阵：第一行 站名,各站名；之后每行 站名,各列的值"""
+    n = len(station_names)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['站名'] + station_names)
+        for i, name in enumerate(station_names):
+            writer.writerow([name] + matrix[i * n:(i + 1) * n].tolist())
+
+def write_fronts(path, station_names, fronts):
+    """按矩阵CSV格式写出 Pareto 前沿：每格为空格分隔的 站数/换乘次数"""
+    n = len(station_names)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['站名'] + station_names)
+        for i, name in enumerate(station_names):
+            writer.writerow([name] + [' '.join(f'{a}/{b}' for a, b in front) for front in fronts[i * n:(i + 1) * n]])
+
+def write_sections(path, sections):
+    """写出 SectionLines.csv：每行 站名1,站名2,线路"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['站名1', '站名2', '线路'])
+        writer.writerows(sections)
+
+def write_binary(path, station_names, routes, changes, next_hops):
+    """写出紧凑二进制格式：头部、换行分隔的站名、uint16 最少站数矩阵、uint8 最少换乘矩阵、uint16 下一站矩阵（本机字节序）"""
+    names = '\n'.join(station_names).encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(MATRIX_HEADER.pack(MATRIX_MAGIC, MATRIX_VERSION, len(station_names), len(names)))
+        f.write(names)
+        f.write(routes.tobytes())
+        f.write(changes.tobytes())
+        f.write(next_hops.tobytes())
+
+def read_binary(path):
+    """读取 write_binary 写出的文件，返回 (站名列表, 最少站数矩阵, 最少换乘矩阵, 下一站矩阵)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, n, names_len = MATRIX_HEADER.unpack_from(data, 0)
+    if magic != MATRIX_MAGIC or version != MATRIX_VERSION:
+        raise ValueError(f"{path} is not a matrix file")
+    pos = MATRIX_HEADER.size
+    station_names = data[pos:pos + names_len].decode('utf-8').split('\n')
+    pos += names_len
+    routes = array('H')
+    routes.frombytes(data[pos:pos + 2 * n * n])
+    pos += 2 * n * n
+    changes = array('B')
+    changes.frombytes(data[pos:pos + n * n])
+    pos += n * n
+    next_hops = array('H')
+    next_hops.frombytes(data[pos:pos + 2 * n * n])
+    return station_names, routes, changes, next_hops
+
+def precompute(name_list_path='NameList.txt', out_dir='.', fewer_transfers=True, pareto=False):
+    """计算各矩阵并写出 ShortestRoute.csv、MinimumChange.csv、NextHop.csv、SectionLines.csv 和 Matrices.bin，返回站点数
+
+    fewer_transfers 为 False 时下一站直接取 BFS 树的父节点，不在同站数的路线中挑换乘少的；
+    pareto 为 True 时另外写出 ParetoRoutes.csv（耗时是其余步骤之和的一倍多，默认不生成）。
+    """
+    lines = read_name_list(name_list_path)
+    station_names, adjacency, station_lines, line_adjacency = build_graph(lines)
+    routes, next_hops = shortest_routes(adjacency, line_adjacency if fewer_transfers else None)
+    changes = minimum_changes(station_lines, line_adjacency)
+    write_csv(os.path.join(out_dir, 'ShortestRoute.csv'), station_names, routes)
+    write_csv(os.path.join(out_dir, 'MinimumChange.csv'), station_names, changes)
+    write_csv(os.path.join(out_dir, 'NextHop.csv'), station_names, next_hops)
+    if pareto:
+        write_fronts(os.path.join(out_dir, 'ParetoRoutes.csv'), station_names, pareto_routes(station_lines, line_adjacency))
+    write_sections(os.path.join(out_dir, 'SectionLines.csv'), section_lines(lines))
+    write_binary(os.path.join(out_dir, 'Matrices.bin'), station_names, routes, changes, next_hops)
+    return len(station_names)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="由 NameList.txt 生成地铁距离矩阵")
+    parser.add_argument('name_list', nargs='?', default='NameList.txt', help="线路文件（默认 NameList.txt）")
+    parser.add_argument('out_dir', nargs='?', default='.', help="输出目录（默认当前目录）")
+    parser.add_argument('--pareto', action='store_true', help="同时生成 ParetoRoutes.csv")
+    parser.add_argument('--plain-next-hops', action='store_true',
+                        help="下一站直接取 BFS 父节点，不按剩余换乘挑选（更快，路线换乘可能更多）")
+    args = parser.parse_args(argv)
+    count = precompute(args.name_list, args.out_dir, fewer_transfers=not args.plain_next_hops, pareto=args.pareto)
+    print(f"{count} stations written to {args.out_dir}")
+    if not args.pareto:
+        print("ParetoRoutes.csv not regenerated; run with --pareto after changing the network")
+
+if __name__ == '__main__':
+    main()
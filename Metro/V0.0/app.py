@@ -3,6 +3,7 @@ import json
 import random
 from datetime import datetime
 from collections import deque, defaultdict
+from functools import lru_cache
 import heapq
 from typing import List, Dict, Tuple, Set
 
@@ -20,6 +21,14 @@ class ShanghaiMetroGraph:
         self.station_lines = defaultdict(set)  # 站点对应的线路
         self.station_nodes = {}  # 站点节点映射（支持同站不同线）
         
+        # 整数节点编号：下标 -> (站名, 线路)，站名 -> 该站所有节点编号，邻接表元素为 (邻居编号, 是否换乘)
+        self.node_keys = []
+        self.node_ids = {}
+        self.station_node_ids = defaultdict(list)
+        self.adjacency = []
+        # 每个起点站的单源搜索结果做 LRU 缓存
+        self.search_from = lru_cache(maxsize=128)(self._search_from)
+        
         # 初始化数据
         self.load_stations()
         self.build_graph()
@@ -234,6 +243,75 @@ class ShanghaiMetroGraph:
                     for j in range(i + 1, len(nodes)):
                         self.graph[nodes[i]].append((nodes[j], 0.5))  # 换乘时间
                         self.graph[nodes[j]].append((nodes[i], 0.5))
+        
+        # 把字符串节点换成整数编号，供 Dijkstra 使用；编号按节点名排序，
+        # 这样代价相同时按编号出堆，与原先按字符串出堆的顺序一致
+        for node_id in sorted(self.station_nodes):
+            info = self.station_nodes[node_id]
+            self.node_ids[node_id] = len(self.node_keys)
+            self.node_keys.append((info["station_name"], info["line"]))
+            self.station_node_ids[info["station_name"]].append(self.node_ids[node_id])
+        self.adjacency = [
+            [(self.node_ids[neighbor], weight != 1) for neighbor, weight in self.graph[node_id]]
+            for node_id in sorted(self.station_nodes)
+        ]
+        self.search_from.cache_clear()
+    
+    def _search_from(self, start_station: str):
+        """
+        从起点站的所有节点出发做一次 Dijkstra，得到到每个节点的结果
+        
+        代价为 站数 + 0.5 * 换乘次数（乘 2 后用整数计算）。
+        返回: (代价列表, 换乘次数列表, 前驱节点列表)，不可达的节点代价为 None
+        """
+        n = len(self.node_keys)
+        cost = [None] * n
+        transfers = [0] * n
+        prev = [None] * n
+        visited = [False] * n
+        pq = []
+        for node in self.station_node_ids.get(start_station, []):
+            cost[node] = 0
+            pq.append((0, node))
+        heapq.heapify(pq)
+        
+        while pq:
+            current_cost, node = heapq.heappop(pq)
+            if visited[node]:
+                continue
+            visited[node] = True
+            for neighbor, is_transfer in self.adjacency[node]:
+                if visited[neighbor]:
+                    continue
+                new_cost = current_cost + (1 if is_transfer else 2)
+                if cost[neighbor] is None or new_cost < cost[neighbor]:
+                    cost[neighbor] = new_cost
+                    transfers[neighbor] = transfers[node] + is_transfer
+                    prev[neighbor] = node
+                    heapq.heappush(pq, (new_cost, neighbor))
+        return cost, transfers, prev
+    
+    def _best_end_node(self, start_station: str, end_station: str):
+        """返回 (搜索结果, 终点站最先出堆的节点，即 (代价, 编号) 最小者)，不可达时节点为 None"""
+        result = self.search_from(start_station)
+        cost = result[0]
+        reachable = [node for node in self.station_node_ids.get(end_station, []) if cost[node] is not None]
+        best = min(reachable, key=lambda node: (cost[node], node), default=None)
+        return result, best
+    
+    def calculate_route_metrics(self, start_station: str, end_station: str) -> Tuple[int, int]:
+        """
+        一次搜索同时计算最小站数和最小换乘次数
+        
+        返回: (最小站数, 最小换乘次数)，不可达时为 (inf, inf)
+        """
+        if start_station == end_station:
+            return 0, 0
+        (cost, transfers, _), best = self._best_end_node(start_station, end_station)
+        if best is None:
+            return float('inf'), float('inf')
+        # 代价 = 2 * 站数 + 换乘次数
+        return (cost[best] - transfers[best]) // 2, transfers[best]
     
     def find_shortest_path(self, start_station: str, end_station: str) -> Tuple[int, int, List[str]]:
         """
@@ -244,84 +322,28 @@ class ShanghaiMetroGraph:
         if start_station == end_station:
             return 0, 0, []
         
-        # 获取起点和终点的所有节点（不同线路）
-        start_nodes = [node for node in self.station_nodes if node.startswith(start_station + "_")]
-        end_nodes = [node for node in self.station_nodes if node.startswith(end_station + "_")]
-        
-        if not start_nodes or not end_nodes:
+        (cost, transfers, prev), best = self._best_end_node(start_station, end_station)
+        if best is None:
             return float('inf'), float('inf'), []
         
-        # Dijkstra算法
-        dist = {}
-        prev = {}
-        visited = set()
-        pq = []
-        
-        # 初始化
-        for node in start_nodes:
-            dist[node] = 0
-            heapq.heappush(pq, (0, node))
-        
-        # Dijkstra主循环
-        while pq:
-            current_dist, current_node = heapq.heappop(pq)
-            
-            if current_node in visited:
-                continue
-            visited.add(current_node)
-            
-            # 如果到达任一终点节点
-            current_station = current_node.split("_")[0]
-            if current_station == end_station:
-                # 重建路径
-                path = []
-                node = current_node
-                while node is not None:
-                    path.append(node)
-                    node = prev.get(node)
-                path.reverse()
-                
-                # 计算站数和换乘次数
-                stations_visited = set()
-                transfers = 0
-                current_line = None
-                
-                for node in path:
-                    station_name = node.split("_")[0]
-                    line_name = node.split("_")[1]
-                    stations_visited.add(station_name)
-                    
-                    if current_line is not None and current_line != line_name:
-                        transfers += 1
-                    current_line = line_name
-                
-                # 站数是访问的唯一站点数减1（起点不计入）
-                station_count = len(stations_visited) - 1
-                
-                return station_count, transfers, path
-            
-            # 遍历邻居
-            for neighbor, weight in self.graph[current_node]:
-                if neighbor in visited:
-                    continue
-                
-                new_dist = current_dist + weight
-                if neighbor not in dist or new_dist < dist[neighbor]:
-                    dist[neighbor] = new_dist
-                    prev[neighbor] = current_node
-                    heapq.heappush(pq, (new_dist, neighbor))
-        
-        # 没有找到路径
-        return float('inf'), float('inf'), []
+        # 重建路径
+        path = []
+        node = best
+        while node is not None:
+            station_name, line = self.node_keys[node]
+            path.append(f"{station_name}_{line}")
+            node = prev[node]
+        path.reverse()
+        return (cost[best] - transfers[best]) // 2, transfers[best], path
     
     def calculate_min_stations(self, start_station: str, end_station: str) -> int:
         """计算最小站数"""
-        stations, _, _ = self.find_shortest_path(start_station, end_station)
+        stations, _ = self.calculate_route_metrics(start_station, end_station)
         return stations if stations != float('inf') else 100  # 默认值
     
     def calculate_min_transfers(self, start_station: str, end_station: str) -> int:
         """计算最小换乘次数"""
-        _, transfers, _ = self.find_shortest_path(start_station, end_station)
+        _, transfers = self.calculate_route_metrics(start_station, end_station)
         return transfers if transfers != float('inf') else 10  # 默认值
     
     def get_all_stations(self) -> List[str]:
@@ -403,9 +425,10 @@ def submit_guess():
     if not guess_info or not answer_info:
         return jsonify({'error': '站点信息不存在'})
     
-    # 计算最小站数和换乘次数
-    min_stations = metro_graph.calculate_min_stations(guess, answer)
-    min_transfers = metro_graph.calculate_min_transfers(guess, answer)
+    # 计算最小站数和换乘次数（一次搜索，按猜测的站缓存）
+    min_stations, min_transfers = metro_graph.calculate_route_metrics(guess, answer)
+    if min_stations == float('inf'):
+        min_stations, min_transfers = 100, 10  # 默认值
     
     # 线路比较
     guess_lines = set(guess_info.get('lines', []))